@@ -57,7 +57,8 @@ from .systools import load_config
 from .read_cf import read_cf_data_2d
 from .seasons import set_season
 from .units import get_conv_ugm3_to_ppbv
-from .units import to_ppbv 
+from .units import to_ppbv
+from .table_of_stations import nearest_grid_index
 
 
 def add_cf(df_in,configfile=None,modcol='conc_mod',obscol='conc_obs',unitcol='conc_unit',show_progress=True):
@@ -129,21 +130,29 @@ def _add_cf_data_to_df(df,idate,cf_config,map_config,obscol,modcol,unitcol):
     lats = dat['lats'].values
     # Precompute conversion factor from ugm-3 to ppbv, using MW of 1.0
     conv = get_conv_ugm3_to_ppbv(dat,temperature_name='t10m',pressure_name='ps',mw=1.0)
+    # Compute the integer grid indices for all rows of this datetime once.
+    # The cube has already been read in one pass above (all variables share
+    # it), so the per-species work below reduces to one fancy-index slice
+    # per field
+    dateidx = df.index[df['ISO8601']==idate]
+    lonidx_all = pd.Series(nearest_grid_index(lons,df.loc[dateidx,'lon'].values),index=dateidx)
+    latidx_all = pd.Series(nearest_grid_index(lats,df.loc[dateidx,'lat'].values),index=dateidx)
+    obstypes = df.loc[dateidx,'obstype']
     # Update for all species, use the model <-> observation pairs specified in the
-    # configuration file 
-    for ivar in map_config: 
+    # configuration file
+    for ivar in map_config:
         var_config = map_config.get(ivar)
         if 'obstype' not in var_config:
             print('Warning: no obstype defined for {} - skip variable'.format(ivar))
             continue
-        idx = df.index[ (df['ISO8601']==idate) & (df['obstype']==var_config.get('obstype')) ]
+        idx = dateidx[ (obstypes==var_config.get('obstype')).values ]
         if len(idx)==0:
             continue
         # by default, set observation column to same as 'value'
         df.loc[idx,obscol] = df.loc[idx,'value']
         # get index values for each location
-        lonidx = [np.abs(lons-i).argmin() for i in df.loc[idx,'lon'].values]
-        latidx = [np.abs(lats-i).argmin() for i in df.loc[idx,'lat'].values]
+        lonidx = lonidx_all.loc[idx].values
+        latidx = latidx_all.loc[idx].values
         # update model value 
         imodcol = modcol+var_config.get('modcol_suffix',"")
         # eventually add new column if it does not yet exist in data frame. This should
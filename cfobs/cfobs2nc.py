@@ -58,8 +58,8 @@ def cfobs2nc(df_in,ofile,res='1x1',obstypes=['o3','no2','pm25'],cols=['conc_mod'
     dask.config.set(pool=ThreadPool(10))
     log = logging.getLogger(__name__)
     # coordinates
-    dlat = np.float(res.split('x')[0])
-    dlon = np.float(res.split('x')[1])
+    dlat = float(res.split('x')[0])
+    dlon = float(res.split('x')[1])
     lat = np.arange(-90.0,90.0001,step=dlat)    
     lon = np.arange(-180.0,180.0001,step=dlon)
     times = times if times is not None else sorted(df_in['ISO8601'].unique())
@@ -48,27 +48,17 @@ def save(df,file,iday,append=False,nfloats=-1,opened_files=[]):
         # reorder to put date and location first
         new_hdr = _get_new_header(df)
         df = df[new_hdr]
-    # Eventually round floats
-    df = _round_floats(df,nfloats)
-    # Write to file
-    df.to_csv(ofile,mode=wm,date_format='%Y-%m-%dT%H:%M:%SZ',index=False,header=hdr,float_format='%.4f')
+    # Write to file. The float precision is handled entirely by the C csv
+    # writer via float_format, which replaces the previous separate rounding
+    # pass over all float columns
+    ffmt = '%.{}f'.format(nfloats) if nfloats>=0 else '%.4f'
+    df.to_csv(ofile,mode=wm,date_format='%Y-%m-%dT%H:%M:%SZ',index=False,header=hdr,float_format=ffmt)
     log.info('{:,} values written to {}'.format(df.shape[0],ofile))
     if ofile not in opened_files:
         opened_files.append(ofile)
     return opened_files
 
 
-def _round_floats(df,nfloats):
-    '''
-    Rounds all float values to the number of digits specified in nfloats. 
-    '''
-    if nfloats>=0:
-        for icol in df.keys():
-            if df[icol].values.dtype == type(0.0):
-                df[icol] = np.round(df[icol].values,nfloats)
-    return df
-
-
 def _get_new_header(df):
     '''
     Returns a list with all header names, sorted in a reasonable fashion. The date (ISO8601) is always placed first.
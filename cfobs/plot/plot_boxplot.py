@@ -19,15 +19,16 @@ import matplotlib.lines as mlines
 import matplotlib.dates as mdates
 import logging
 
-from ..parse_string import parse_date 
+from ..parse_string import parse_date
 from ..parse_string import parse_vars
 from ..statistics import compute_metrics_by_location
 from ..statistics import compute_unaggregated_metrics
+from ..regions import set_regions
 
 
-def plot(orig_df,iday,obstype='o3',modvar=None,plot_by_season=0,title='!t (%Y-%m-%d)',modcol='conc_mod',obscol='conc_obs',loccol='location',ofile='boxplot_!t_%Y%m%d.png',statistic='bias',aggregate_by_location=0,minnobs=2,ylabel='!t',hscale=5,vscale=5,**kwargs):
+def plot(orig_df,iday,obstype='o3',modvar=None,plot_by_season=0,plot_by_region=0,regionsfile=None,title='!t (%Y-%m-%d)',modcol='conc_mod',obscol='conc_obs',loccol='location',ofile='boxplot_!t_%Y%m%d.png',statistic='bias',aggregate_by_location=0,minnobs=2,ylabel='!t',hscale=5,vscale=5,**kwargs):
     '''
-    Make boxplot of CF vs observation. 
+    Make boxplot of CF vs observation.
     '''
 
     log = logging.getLogger(__name__)
@@ -36,6 +37,13 @@ def plot(orig_df,iday,obstype='o3',modvar=None,plot_by_season=0,title='!t (%Y-%m
     if df.shape[0] == 0:
         log.warning('No data of obstype {} found!'.format(obstype))
         return
+    # group the boxes by region if requested. The region column set by
+    # update_regions is reused if present, so the assignment is not redone
+    # for every plot call
+    if plot_by_region==1:
+        if 'region' not in df.keys():
+            df = set_regions(df,None,regionsfile)
+        kwargs.setdefault('groupby','region')
     nrow = 1
     if plot_by_season>0:
         df = seasons.set_season(df)
@@ -58,6 +66,10 @@ def plot(orig_df,iday,obstype='o3',modvar=None,plot_by_season=0,title='!t (%Y-%m
                        obscol=obscol,
                        loccol=loccol,
                        minnobs=minnobs)
+            # the aggregation keeps numeric columns only - re-attach the
+            # region of each location so the boxes can still be grouped by it
+            if plot_by_region==1 and 'region' not in df_stats.keys():
+                df_stats = df_stats.join(idf.groupby(loccol)['region'].first())
         else:
             df_stats = compute_unaggregated_metrics(idf,modcol,obscol)
         # Make plot
@@ -8,6 +8,7 @@
 # HISTORY:
 # 20191113 - christoph.a.keller at nasa.gov - Initial version
 # ****************************************************************************
+import functools
 import numpy as np
 import datetime as dt
 import pandas as pd
@@ -15,6 +16,7 @@ import os
 import matplotlib as mpl
 mpl.use('Agg')
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
 import matplotlib.lines as mlines
 import matplotlib.dates as mdates
 from matplotlib.gridspec import GridSpec
@@ -30,6 +32,18 @@ from ..statistics import compute_metrics_by_location
 from ..read_cf import get_cf_map_taverage
 
 
+@functools.lru_cache(maxsize=32)
+def _get_colormap(name):
+    '''Cached colormap lookup. The same few palettes are requested for every panel of every species.'''
+    return get_cmap(name)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_norm(minv,maxv):
+    '''Cached Normalize instance for the given value range.'''
+    return mcolors.Normalize(vmin=minv,vmax=maxv)
+
+
 def plot(orig_df,iday,endday=None,obstype='o3',plot_by_season=0,mapfiles='',modvar='O3',mapvar='O3',mapvarscal=1.0,title='!v (%Y-%m-%d)',
          modcol='conc_mod',obscol='conc_obs',loccol='location',minnobs=2,ofile='map_!v_%Y%m%d.png',statistic='IOA',maplabel='!v',**kwargs):
     '''
@@ -92,7 +106,7 @@ def plot(orig_df,iday,endday=None,obstype='o3',plot_by_season=0,mapfiles='',modv
     return
 
 
-def _plot_map_and_statistics(fig,gs,idx,cf,dat,season_name=None,statistic='IOA',maxbias=50.0,maxstat=50.0,minval=0.0,maxval=80.0,dotedgecolor=None,dotsize=10,latcol='lat',loncol='lon',obscol='conc_obs',maplabel='None',colormap='rainbow',extent=None):
+def _plot_map_and_statistics(fig,gs,idx,cf,dat,season_name=None,statistic='IOA',maxbias=50.0,maxstat=50.0,minval=0.0,maxval=80.0,dotedgecolor=None,dotsize=10,latcol='lat',loncol='lon',obscol='conc_obs',maplabel='None',colormap='rainbow',extent=None,renderer='pcolormesh',shading='auto'):
     '''
     Plots a global map with the annual average model field and the observations overlaid to it.
     '''
@@ -100,15 +114,21 @@ def _plot_map_and_statistics(fig,gs,idx,cf,dat,season_name=None,statistic='IOA',
     log = logging.getLogger(__name__)
     log.info('Plot map...')
     proj = ccrs.PlateCarree()
-    # plot map, overlay observations 
-    colormap = get_cmap(colormap)
+    # plot map, overlay observations
+    colormap = _get_colormap(colormap)
     ax = fig.add_subplot(gs[0,idx],projection=proj)
     if extent is not None:
         ax.set_extent(extent,crs=proj)
     cf1 = ax.add_feature(cartopy.feature.BORDERS, edgecolor="grey")
     cf2 = ax.add_feature(cartopy.feature.COASTLINE, edgecolor="black")
-    flev = np.linspace(minval,maxval,51)
-    cp = ax.contourf(cf.lon.values,cf.lat.values,cf.values,transform=proj,cmap=colormap,levels=flev,extend='max')
+    # pcolormesh draws the raw cells directly and skips the (expensive)
+    # contour triangulation; contourf remains available via the renderer
+    # argument for smoothed maps
+    if renderer=='pcolormesh':
+        cp = ax.pcolormesh(cf.lon.values,cf.lat.values,cf.values,transform=proj,cmap=colormap,norm=_get_norm(minval,maxval),shading=shading)
+    else:
+        flev = np.linspace(minval,maxval,51)
+        cp = ax.contourf(cf.lon.values,cf.lat.values,cf.values,transform=proj,cmap=colormap,levels=flev,extend='max')
     # Overlay obs 
     sc = _add_obs_to_map(ax,dat[loncol].values,dat[latcol].values,dat[obscol].values,dotsize,dotedgecolor,colormap,proj,minval,maxval)
     cbar = fig.colorbar(cp,ax=ax,shrink=1.0,extend='max',pad=0.02,ticks=np.linspace(minval,maxval,11))
@@ -133,7 +153,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv = maxbias*-1.0
         maxv = maxbias
         flev = np.linspace(minv,maxv,101)
-        colormap = get_cmap('seismic')
+        colormap = _get_colormap('seismic')
         ylab = 'Bias (model - observation)'
         extd = 'both'
     if stat == 'NMB':
@@ -141,7 +161,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv = maxstat*-1.0
         maxv = maxstat
         flev = np.linspace(minv,maxv,101)
-        colormap = get_cmap('seismic')
+        colormap = _get_colormap('seismic')
         ylab = 'Normalized mean bias'
         extd = 'both'
     if stat == 'RMSE':
@@ -149,7 +169,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv =  0.0 
         maxv =  maxstat 
         flev = np.linspace(minv,maxv,51)
-        colormap = get_cmap('coolwarm')
+        colormap = _get_colormap('coolwarm')
         ylab = 'Root mean square error'
         extd = 'max'
     if stat == 'IOA':
@@ -157,7 +177,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv =  0.0 
         maxv =  1.0
         flev = np.linspace(minv,maxv,51)
-        colormap = get_cmap('gist_rainbow_r')
+        colormap = _get_colormap('gist_rainbow_r')
         ylab = 'Index of agreement'
         extd = 'neither'
     if stat == 'R2':
@@ -165,7 +185,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv =  0.0 
         maxv =  1.0
         flev = np.linspace(minv,maxv,51)
-        colormap = get_cmap('gist_rainbow_r')
+        colormap = _get_colormap('gist_rainbow_r')
         ylab = 'R$^{2}$'
         extd = 'neither'
     if stat == 'MAE':
@@ -173,7 +193,7 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
         minv =  0.0 
         maxv =  maxstat
         flev = np.linspace(minv,maxv,51)
-        colormap = get_cmap('coolwarm')
+        colormap = _get_colormap('coolwarm')
         ylab = 'Mean absolute error'
         extd = 'max'
     ax = fig.add_subplot(this_gs,projection=proj)
@@ -190,5 +210,5 @@ def _plot_statistics(fig,this_gs,stat,proj,dat,maxbias,maxstat,loncol,latcol,dot
 
 def _add_obs_to_map(ax,lons,lats,vals,dotsize,dotedgecolor,colormap,proj,minv,maxv):
     '''Overlay observation data to a previously drawn map.'''
-    return ax.scatter(lons,lats,c=vals,s=dotsize,cmap=colormap,transform=proj,vmin=minv,vmax=maxv,edgecolors=dotedgecolor)
+    return ax.scatter(lons,lats,c=vals,s=dotsize,cmap=colormap,transform=proj,norm=_get_norm(minv,maxv),edgecolors=dotedgecolor)
 
@@ -51,7 +51,7 @@ def plot(orig_df,iday,obstype='o3',modvar=None,title=None,by='location',ofile='t
             lats.append(iidf.lat.values.mean())
         panel_names = [x for _,x in sorted(zip(lats,panel_names),reverse=True)] 
     # Get number of figures 
-    nfigures = np.int(np.ceil(np.float(npanels)/(ncol*nrow)))
+    nfigures = int(np.ceil(float(npanels)/(ncol*nrow)))
     cnt = 0
     ylab = parse_vars(ylabel,obstype,modvar)
     ofile_template = parse_date(parse_vars(ofile,obstype,modvar),iday)
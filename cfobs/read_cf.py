@@ -27,6 +27,18 @@ AVG_LABEL_BEFORE = 'average_offset_before'
 AVG_LABEL_AFTER  = 'average_offset_after'
 HR_TO_NS = 60*60*10**9
 
+# cache of open (single-file or OPeNDAP) dataset handles, keyed by path.
+# Reusing the handle avoids re-opening the connection and re-parsing the
+# metadata when several variables are read from the same source
+_DS_CACHE = {}
+
+
+def _open_dataset_cached(ifile):
+    '''Open a single-file or OPeNDAP dataset, reusing open handles.'''
+    if ifile not in _DS_CACHE:
+        _DS_CACHE[ifile] = xr.open_dataset(ifile)
+    return _DS_CACHE[ifile]
+
 def read_cf_data_2d(idate,config=None,config_file=None,suppress_messages=False):
     '''
     Reads the CF output for the given datetime and returns all variables as specified
@@ -169,15 +181,20 @@ def get_cf_map_taverage(ifiles,startday,endday,varnames,scale_factor,season_name
     log = logging.getLogger(__name__)
     log.info('Compute time-averaged CF global map from {}'.format(ifiles))
     if len(glob.glob(ifiles))>1:
-        ds = xr.open_mfdataset(ifiles) #,combine='by_coords')
+        src = xr.open_mfdataset(ifiles) #,combine='by_coords')
+        ds = src
     else:
-        ds = xr.open_dataset(ifiles)
-        ds = ds.sel(time=slice(startday,endday))
+        # single files (incl. OPeNDAP addresses) go through the handle
+        # cache, so consecutive calls against the same source - e.g. the
+        # per-species map plots - share one open connection
+        src = None
+        ds = _open_dataset_cached(ifiles).sel(time=slice(startday,endday))
     # eventually subselect months
     if season_name is not None:
         ds = ds.sel(time=_is_season(ds['time.season'],season_name))
     da = get_array_from_ds(ds,varnames)
-    ds.close()
+    if src is not None:
+        src.close()
     # mean over time 
     da = da.mean(dim='time')
     if 'lev' in da.dims:
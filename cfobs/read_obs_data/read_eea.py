@@ -20,11 +20,21 @@ import argparse
 import numpy as np
 import datetime as dt
 import pandas as pd
-import pytz
 import yaml
 import glob
 import requests
-from dateutil import parser
+
+# use PyArrow's multithreaded CSV reader if available
+try:
+    from pyarrow import csv as pacsv
+except ImportError:
+    pacsv = None
+
+# use the C implementation of the yaml loader/dumper if available
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import FullLoader as YamlLoader, Dumper as YamlDumper
 
 from ..cfobs_save import save as cfobs_save
 
@@ -44,7 +54,7 @@ def read_eea(iday=None,idir=None,url_country=None,url_start_year=None,url_end_ye
     if stationsfile_local is not None:
         if os.path.isfile(stationsfile_local):
             with open(stationsfile_local,'r') as f:
-                stations = yaml.load(f, Loader=yaml.FullLoader)
+                stations = yaml.load(f, Loader=YamlLoader)
         else:
             stations = {}
     # read data for each species
@@ -70,7 +80,7 @@ def read_eea(iday=None,idir=None,url_country=None,url_start_year=None,url_end_ye
     # write out stations if specified so
     if stationsfile_local is not None:
         with open(stationsfile_local,'w') as file:
-            yaml.dump(stations, file)
+            yaml.dump(stations, file, Dumper=YamlDumper)
         log.info('Written YAML file: {}'.format(stationsfile_local))
     # merge all data into one
     df = pd.concat(dfs,ignore_index=True) if len(dfs)>0 else None 
@@ -142,42 +152,53 @@ def _read_file(ifile,meta,stations,time_offset=0,firstday=None,lastday=None):
         log.warning('file not found: {}'.format(ifile))
         return None,locname,stations
     log.info('Reading {}'.format(ifile))
-    origtb = pd.read_csv(ifile,sep=",") ##,encoding="ISO-8859-1")
+    origtb = _read_csv(ifile,sep=",",columns=['SamplingPoint','Concentration','DatetimeBegin','AirPollutant','UnitOfMeasurement'])
+    if origtb.shape[0]==0:
+        log.warning('No entries found in {}'.format(ifile))
+        return None,locname,stations
     # data should be for one station only:
-    all_stations = list(origtb.SamplingPoint.unique())
-    if len(all_stations)>1:
+    thisstation = origtb['SamplingPoint'].iat[0]
+    if origtb['SamplingPoint'].nunique()>1:
         a = origtb.groupby('SamplingPoint').count().reset_index()
-        istation = a.loc[a['Concentration']==a['Concentration'].values.max(),'SamplingPoint'].values[0]
-        tbnew = origtb.loc[origtb['SamplingPoint']==istation].copy()
-        origtb = tbnew.copy()
-        log.warning('More than one station found in file {} - will only read data for location with most values ({})'.format(ifile,istation))
+        thisstation = a.loc[a['Concentration']==a['Concentration'].values.max(),'SamplingPoint'].iat[0]
+        origtb = origtb.loc[origtb['SamplingPoint']==thisstation].copy()
+        log.warning('More than one station found in file {} - will only read data for location with most values ({})'.format(ifile,thisstation))
     # only read valid entries
     tb = origtb.loc[~np.isnan(origtb['Concentration'].values)].copy()
     del(origtb)
     if tb.shape[0]==0:
         log.warning('No valid concentration entries found in {}'.format(ifile))
         return None,locname,stations
+    # prefilter by date using a string comparison on the raw date column.
+    # DatetimeBegin is ISO-8601 and thus lexicographically sortable, so this
+    # tosses out-of-range entries before the (expensive) date parsing below.
+    # Pad the window by one day to account for the local time offset - the
+    # exact filter on the parsed UTC dates is applied further below.
+    if firstday is not None:
+        tb = tb.loc[tb['DatetimeBegin'].str[:10] >= (firstday-dt.timedelta(days=1)).strftime('%Y-%m-%d')]
+    if lastday is not None:
+        tb = tb.loc[tb['DatetimeBegin'].str[:10] <= lastday.strftime('%Y-%m-%d')]
+    if tb.shape[0]==0:
+        log.warning('No entries found in specified time range in {}'.format(ifile))
+        return None,locname,stations
     # get meta data for that station
-    thisstation = tb.SamplingPoint.unique()[0]
     istat = meta.loc[meta['SamplingPoint']==thisstation]
     if istat.shape[0]==0:
         log.warning('No meta data found for sampling point: {} - cannot read data')
         return None,locname,stations
-    locname = str(istat['AirQualityStation'].values[0].replace('STA.','').replace('STA-','').replace('STA_',''))
-    loclat  = np.round(np.float(istat['Latitude'].values[0]),4)
-    loclon  = np.round(np.float(istat['Longitude'].values[0]),4)
-    loctype = istat['AirQualityStationType'].values[0]
-    loccountry = istat['Countrycode'].values[0]
+    locname = str(istat['AirQualityStation'].iat[0].replace('STA.','').replace('STA-','').replace('STA_',''))
+    loclat  = round(float(istat['Latitude'].iat[0]),4)
+    loclon  = round(float(istat['Longitude'].iat[0]),4)
+    loctype = istat['AirQualityStationType'].iat[0]
+    loccountry = istat['Countrycode'].iat[0]
     locname = '_'.join(('EEA',loccountry,locname))
-    # read dates
-    offset = dt.timedelta(minutes=time_offset)
-    utc = pytz.utc
+    # read dates. Convert to (timezone-naive) UTC in one vectorized pass.
+    # DatetimeBegin has the fixed format 'YYYY-MM-DD HH:MM:SS +HH:MM', so
+    # pass the format explicitly to skip format sniffing per entry.
     df = pd.DataFrame()
-    df['localtime'] = [parser.parse(i) for i in tb['DatetimeBegin']]
-    df['ISO8601'] = [i.astimezone(utc)+offset for i in df['localtime']]
-    ns = 1.0e-9
-    df['ISO8601'] = [dt.datetime.utcfromtimestamp(i.astype(int)*ns) for i in df['ISO8601'].values]
-    df['localtime'] = [parser.parse(i,ignoretz=True) for i in tb['DatetimeBegin']]
+    utctime = pd.to_datetime(tb['DatetimeBegin'],format='%Y-%m-%d %H:%M:%S %z',utc=True,cache=True) + pd.Timedelta(minutes=time_offset)
+    df['ISO8601'] = utctime.dt.tz_localize(None).values
+    df['localtime'] = pd.to_datetime(tb['DatetimeBegin'].str.slice(0,19),format='%Y-%m-%d %H:%M:%S',cache=True).values
     # add station information
     df['original_station_name'] = [locname for i in range(df.shape[0])]
     df['lat'] = [loclat for i in range(df.shape[0])]
@@ -195,11 +216,9 @@ def _read_file(ifile,meta,stations,time_offset=0,firstday=None,lastday=None):
     df.loc[df['obstype']=='PM2.5','obstype'] = 'pm25'
     # filter by days
     if firstday is not None:
-        #firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
         log.info('Only use data after {}'.format(firstday))
         df = df.loc[df['ISO8601'] >= firstday]
     if lastday is not None:
-        #lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
         log.info('Only use data before {}'.format(lastday))
         df = df.loc[df['ISO8601'] < lastday]
     # sort data
@@ -215,5 +234,18 @@ def _read_meta(metafile):
     '''Read meta data'''
     log = logging.getLogger(__name__)
     log.info('Reading metadata from {}'.format(metafile))
-    meta = pd.read_csv(metafile,sep='\t')
+    meta = _read_csv(metafile,sep='\t')
     return meta
+
+
+def _read_csv(ifile,sep=',',columns=None):
+    '''
+    Read a csv file into a pandas dataframe. Uses the (multithreaded) PyArrow
+    csv reader if available, with pandas as fallback for remote files.
+    '''
+    if pacsv is None or 'https' in ifile:
+        return pd.read_csv(ifile,sep=sep)
+    tb = pacsv.read_csv(ifile,
+                        parse_options=pacsv.ParseOptions(delimiter=sep),
+                        convert_options=pacsv.ConvertOptions(include_columns=columns,include_missing_columns=True))
+    return tb.to_pandas()
@@ -97,9 +97,9 @@ def _read_single_file(ifile,firstday=None,lastday=None,time_offset=0,preferred_u
         if 'Station name' in c:
             station_name = c.split(':')[1].replace(' ','')
         if 'Station latitude' in c:
-            station_lat = np.float(c.split(':')[1].replace(' ',''))
+            station_lat = float(c.split(':')[1].replace(' ',''))
         if 'Station longitude' in c:
-            station_lon = np.float(c.split(':')[1].replace(' ',''))
+            station_lon = float(c.split(':')[1].replace(' ',''))
     if station_name == 'unknown':
         log.warning('Unknown station name for file {}'.format(ifile))
     if np.isnan(station_lat):
@@ -49,16 +49,18 @@ def _read_single_file(ifile,firstday=None,lastday=None):
     log = logging.getLogger(__name__)
     log.info('Reading {}'.format(ifile))
     with open(ifile) as f:
-        lines = f.readlines()
-    nhdr,para,unit = _read_header(lines)
-    dates,values,names,lats,lons = _read_data(lines,nhdr)
+        lines = [f.readline()]
+        nhdr,para,unit = _read_header(lines)
+        for i in range(nhdr-1):
+            lines.append(f.readline())
+    dates,values,names,lats,lons = _read_data(ifile,lines,nhdr)
     # construct array
     nrow = len(dates)
     idf = pd.DataFrame()
     idf['ISO8601'] = dates
     idf['original_station_name'] = names
-    idf['lat'] = lats 
-    idf['lon'] = lons 
+    idf['lat'] = lats
+    idf['lon'] = lons
     idf['obstype'] = [para for i in range(nrow)]
     idf['unit'] = [unit for i in range(nrow)]
     idf['value'] = values
@@ -77,45 +79,29 @@ def _read_header(lines):
     log = logging.getLogger(__name__)
     parameter='co'
     unit='ppbv'
-    header_lines = np.int(_parse_line(lines[0]))
+    header_lines = int(_parse_line(lines[0]))
     return header_lines,parameter,unit
 
 
-def _read_data(lines,nhdr):
+def _read_data(ifile,lines,nhdr):
     '''Read observation data and corresponding dates'''
     log = logging.getLogger(__name__)
     hdr = lines[nhdr-1].replace('\n','').replace('# data_fields: ','').split()
-    cyr = hdr.index('sample_year')
-    cmt = hdr.index('sample_month')
-    cdy = hdr.index('sample_day')
-    chr = hdr.index('sample_hour')
-    cmn = hdr.index('sample_minute')
-    cvl = hdr.index('analysis_value')
-    cqc = hdr.index('analysis_flag')
-    cnm = hdr.index('sample_site_code')
-    clt = hdr.index('sample_latitude')
-    cln = hdr.index('sample_longitude')
-    dates = []
-    values = []
-    names = []
-    lats = []
-    lons = []
-    for iline in lines[nhdr:]:
-        ivals = iline.replace('\n','').split()
-        # Check for quality flag - only accept quality flags that begin with '..'
-        qc =  ivals[cqc]
-        if qc[0:2] != '..':
-            continue
-        idate = dt.datetime(np.int(ivals[cyr]),np.int(ivals[cmt]),np.int(ivals[cdy]),np.int(ivals[chr]),np.int(ivals[cmn]),0)
-        dates.append(idate)
-        values.append(np.float(ivals[cvl]))
-        names.append(ivals[cnm])
-        lats.append(np.float(ivals[clt]))
-        lons.append(np.float(ivals[cln]))
-    i = len(dates)
-    j = len(lines)-nhdr
-    log.info('Read {:d} valid entries from {:d} total entries ({:.2f}%)'.format(i,j,np.float(i)/np.float(j)*100.0))
-    return dates,values,names,lats,lons
+    # read the data block in one pass through the C tokenizer
+    tb = pd.read_csv(ifile,sep=r'\s+',skiprows=nhdr,header=None,names=hdr,
+                     dtype={'analysis_flag':str,'sample_site_code':str})
+    j = tb.shape[0]
+    # Check for quality flag - only accept quality flags that begin with '..'
+    tb = tb.loc[tb['analysis_flag'].str.startswith('..')]
+    i = tb.shape[0]
+    dates = pd.to_datetime(tb[['sample_year','sample_month','sample_day','sample_hour','sample_minute']].rename(
+        columns={'sample_year':'year','sample_month':'month','sample_day':'day','sample_hour':'hour','sample_minute':'minute'}))
+    values = tb['analysis_value'].values
+    names = tb['sample_site_code'].values
+    lats = tb['sample_latitude'].values
+    lons = tb['sample_longitude'].values
+    log.info('Read {:d} valid entries from {:d} total entries ({:.2f}%)'.format(i,j,float(i)/float(j)*100.0))
+    return dates.values,values,names,lats,lons
 
 
 def _parse_line(iline,elem=1):
@@ -16,8 +16,9 @@
 # requirements
 import glob
 import logging
-import os 
+import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import datetime as dt
 from pytz import timezone
@@ -25,10 +26,27 @@ import pytz
 import pandas as pd
 import yaml
 
+# use the multithreaded pyarrow csv engine if available
+try:
+    import pyarrow
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    _CSV_ENGINE = 'c'
+
 from ..parse_string import parse_date
 from ..systools import load_config
 from ..cfobs_save import save as cfobs_save
 
+# typed empty frame returned when no valid data is found, so that downstream
+# code can rely on the columns being present
+EMPTY_SCHEMA = pd.DataFrame({'ISO8601':pd.Series(dtype='datetime64[ns]'),
+                             'original_station_name':pd.Series(dtype='object'),
+                             'lat':pd.Series(dtype='float64'),
+                             'lon':pd.Series(dtype='float64'),
+                             'obstype':pd.Series(dtype='object'),
+                             'unit':pd.Series(dtype='object'),
+                             'value':pd.Series(dtype='float64')})
+
 
 def read_japan(iday=None,configfile=None,data_dir=None,firstday=None,lastday=None,stationsfile_local=None,**kwargs):
     '''
@@ -36,6 +54,7 @@ def read_japan(iday=None,configfile=None,data_dir=None,firstday=None,lastday=Non
     '''
     log = logging.getLogger(__name__)
     config = load_config(configfile)
+    id_index = _build_station_index(config)
     idirs = sorted(glob.glob(data_dir))
     if len(idirs)==0:
         log.warning('No files found {}'.format(data_dir))
@@ -49,11 +68,11 @@ def read_japan(iday=None,configfile=None,data_dir=None,firstday=None,lastday=Non
         else:
             stations = {}
     for idir in idirs:
-        ifiles = glob.glob(idir+'/*.csv')
+        ifiles = sorted(_walk_csv(idir)) if os.path.isdir(idir) else [idir]
         if len(ifiles)==0:
             log.warning('No files found {}'.format(idir))
-            continue 
-        df, stations =  _read_data(config,ifiles,stations,**kwargs)
+            continue
+        df, stations =  _read_data(config,id_index,ifiles,stations,**kwargs)
     # filter by days
     if firstday is not None:
         log.info('Only use data after {}'.format(firstday))
@@ -61,6 +80,11 @@ def read_japan(iday=None,configfile=None,data_dir=None,firstday=None,lastday=Non
     if lastday is not None:
         log.info('Only use data before {}'.format(lastday))
         df = df.loc[df['ISO8601'] < lastday]
+    # store repeated strings as categoricals to save memory. This is done
+    # after the concat across files so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit'):
+        if c in df:
+            df[c] = df[c].astype('category')
     # write out stations if specified so
     if stationsfile_local is not None:
         with open(stationsfile_local,'w') as file:
@@ -69,63 +93,82 @@ def read_japan(iday=None,configfile=None,data_dir=None,firstday=None,lastday=Non
     return df
 
 
-def _read_data(config,ifiles,stations,**kwargs):
+def _walk_csv(root):
+    '''
+    Recursively yield all csv files below root. os.scandir reuses the file
+    type from the directory listing, which makes this much cheaper than a
+    glob call per directory on trees with many station directories.
+    '''
+    for e in os.scandir(root):
+        if e.is_dir():
+            yield from _walk_csv(e.path)
+        elif e.name.endswith('.csv'):
+            yield e.path
+
+
+def _read_data(config,id_index,ifiles,stations,nproc=1,**kwargs):
     '''
-    Read all data from a directory
+    Read all data from a directory. The individual files are independent of
+    each other and can be read in parallel if nproc is larger than 1.
     '''
     log = logging.getLogger(__name__)
-    dats = []
-    for ifile in ifiles:
-        idat, stations = _read_file(ifile,config,stations,**kwargs)
-        if idat is not None:
-            dats.append(idat)
-    df = pd.concat(dats,ignore_index=True) if len(dats)>0 else pd.DataFrame() 
+    if nproc > 1:
+        with ThreadPoolExecutor(max_workers=nproc) as pool:
+            results = list(pool.map(lambda f: _read_file(f,config,id_index,stations,**kwargs),ifiles))
+    else:
+        results = [_read_file(ifile,config,id_index,stations,**kwargs) for ifile in ifiles]
+    dats = [idat for idat,istations in results if idat is not None]
+    if len(dats)==0:
+        df = EMPTY_SCHEMA.copy()
+    elif len(dats)==1:
+        df = dats[0]
+    else:
+        df = pd.concat(dats,ignore_index=True)
     return df, stations
 
 
-def _read_file(ifile,config,stations,time_offset=0,ofile_local=None,ofile_local_append=True,**kwargs):
+def _read_file(ifile,config,id_index,stations,time_offset=0,ofile_local=None,ofile_local_append=True,**kwargs):
     '''
     Read a single file
     '''
     log = logging.getLogger(__name__)
     log.info('Reading {}'.format(ifile))
-    tb = pd.read_csv(ifile,sep=",",encoding="ISO-8859-1")
+    tb = pd.read_csv(ifile,sep=",",encoding="ISO-8859-1",engine=_CSV_ENGINE)
     keys = list(tb.keys())
     tb = tb.rename(columns={keys[0]:'station',keys[1]:'date',keys[2]:'hour'})
     # get station info
     if len(tb.station.unique())>1:
         log.warning('More than one station ID found in {}'.format(ifile))
-    name,lat,lon = _get_station(config,tb.station.values[0],**kwargs)
+    name,lat,lon = _get_station(id_index,tb.station.values[0],**kwargs)
     if name is None:
-        return None
-    # get dates
-    offset = dt.timedelta(minutes=time_offset)
-    days = [dt.datetime.strptime(i,"%Y/%m/%d") for i in tb['date']]
-    hour = [i if i<=23 else 0 for i in tb['hour']]
-    dates = [dt.datetime(i.year,i.month,i.day,j,0,0) for i,j in zip(days,hour)]
-    dates = [i+dt.timedelta(hours=24) if i.hour==0 else i for i in dates]
-    nrow = len(dates)
-    alldat = []
+        return None, stations
+    # get dates. Hour 24 (and anything above 23) wraps to hour 0 of the next day
+    hour = tb['hour'].to_numpy()
+    hour = np.where(hour>23,0,hour)
+    hour = np.where(hour==0,24,hour)
+    days = pd.to_datetime(tb['date'],format='%Y/%m/%d',cache=True)
+    dates = (days + pd.to_timedelta(hour,unit='h')).to_numpy()
+    # accumulate the columns as numpy arrays and build a single dataframe at
+    # the end, which avoids the overhead of one dataframe per variable
+    cols = {k:[] for k in ('ISO8601','original_station_name','lat','lon','obstype','unit','value')}
     vars = config.get('vars')
-    for v in vars:
-        name_on_file = vars.get(v).get('name_on_file',v)
-        scal = vars.get(v).get('scal',1.0)
-        ounit = vars.get(v).get('out_unit','NaN')
+    specs = [(v,d.get('name_on_file',v),d.get('scal',1.0),d.get('out_unit','NaN')) for v,d in vars.items()]
+    for v,name_on_file,scal,ounit in specs:
         if name_on_file not in tb:
             log.warning('Not found in file - skip: {}'.format(name_on_file))
             continue
-        idf = pd.DataFrame()
-        idf['ISO8601'] = dates
-        idf['original_station_name'] = [name for i in range(nrow)] 
-        idf['lat'] = [lat for i in range(nrow)] 
-        idf['lon'] = [lon for i in range(nrow)] 
-        idf['obstype'] = [v for i in range(nrow)]
-        idf['unit'] = [ounit for i in range(nrow)]
-        idf['value'] = [i*scal for i in tb[name_on_file].values]
-        idf = idf.loc[~np.isnan(idf['value'])]
-        if idf.shape[0]>0:
-            alldat.append(idf)
-    df = pd.concat(alldat) if len(alldat)>0 else None
+        vals = tb[name_on_file].to_numpy(dtype=np.float64) * scal
+        mask = ~np.isnan(vals)
+        nval = int(mask.sum())
+        if nval>0:
+            cols['ISO8601'].append(dates[mask])
+            cols['original_station_name'].append(np.full(nval,name,dtype=object))
+            cols['lat'].append(np.full(nval,lat))
+            cols['lon'].append(np.full(nval,lon))
+            cols['obstype'].append(np.full(nval,v,dtype=object))
+            cols['unit'].append(np.full(nval,ounit,dtype=object))
+            cols['value'].append(vals[mask])
+    df = pd.DataFrame({k:np.concatenate(v) for k,v in cols.items()}) if len(cols['value'])>0 else None
     if df is not None and ofile_local is not None:
         ofile = ofile_local.replace('%l',name)
         _ = cfobs_save(df,ofile,dt.datetime(2018,1,1),append=ofile_local_append)
@@ -136,25 +179,31 @@ def _read_file(ifile,config,stations,time_offset=0,ofile_local=None,ofile_local_
     return df, stations
 
 
-def _get_station(config,id,default_lat=None,default_lon=None,prefix=None):
+def _build_station_index(config):
+    '''
+    Build a station ID -> (name,lat,lon) lookup from the configuration
+    so that station lookups are O(1) instead of a scan over all locations.
+    '''
+    locations = config.get('locations',{})
+    return {locations.get(l).get('id'):(l,locations.get(l).get('lat'),locations.get(l).get('lon')) for l in locations}
+
+
+def _get_station(id_index,id,default_lat=None,default_lon=None,prefix=None):
     '''
     Get station information for the given ID
     '''
     log = logging.getLogger(__name__)
-    locations = config.get('locations')
-    name = '_'.join((prefix,str(id))) if prefix is not None else None
-    lat = default_lat
-    lon = default_lon 
-    for l in locations:
-        if locations.get(l).get('id') == id:
-            name = l 
-            lat = locations.get(l).get('lat')
-            lon = locations.get(l).get('lon')
-            break
+    entry = id_index.get(id)
+    if entry is not None:
+        name,lat,lon = entry
+    else:
+        name = '_'.join((prefix,str(id))) if prefix is not None else None
+        lat = default_lat
+        lon = default_lon
     if name is None:
         log.warning('No station entry found for ID {}'.format(id))
         return None,None,None
-    if name is None or lat is None or lon is None:
+    if lat is None or lon is None:
         log.warning('At least one entry missing for station ID {}'.format(id))
         return None,None,None
     return name,lat,lon
@@ -24,10 +24,27 @@ import pytz
 import pandas as pd
 import yaml
 
+# use the multithreaded pyarrow csv engine if available
+try:
+    import pyarrow
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    _CSV_ENGINE = 'c'
+
 from ..parse_string import parse_date
 from ..systools import load_config
 from ..cfobs_save import save as cfobs_save
 
+# typed empty frame returned when no valid data is found, so that downstream
+# code can rely on the columns being present
+EMPTY_SCHEMA = pd.DataFrame({'ISO8601':pd.Series(dtype='datetime64[ns]'),
+                             'original_station_name':pd.Series(dtype='object'),
+                             'lat':pd.Series(dtype='float64'),
+                             'lon':pd.Series(dtype='float64'),
+                             'obstype':pd.Series(dtype='object'),
+                             'unit':pd.Series(dtype='object'),
+                             'value':pd.Series(dtype='float64')})
+
 
 def read_melbourne(iday=None,configfile=None,ifile=None,spec=None,firstday=None,lastday=None,**kwargs):
     '''
@@ -35,7 +52,8 @@ def read_melbourne(iday=None,configfile=None,ifile=None,spec=None,firstday=None,
     '''
     log = logging.getLogger(__name__)
     config = load_config(configfile)
-    df = _read_file(ifile,config,spec,**kwargs)
+    id_index = _build_station_index(config)
+    df = _read_file(ifile,config,id_index,spec,**kwargs)
     # filter by days
     if firstday is not None:
         log.info('Only use data after {}'.format(firstday))
@@ -47,67 +65,86 @@ def read_melbourne(iday=None,configfile=None,ifile=None,spec=None,firstday=None,
     return df
 
 
-def _read_file(ifile,config,spec,time_offset=0,ofile_local=None,ofile_local_append=True,**kwargs):
+def _read_file(ifile,config,id_index,spec,time_offset=0,ofile_local=None,ofile_local_append=True,**kwargs):
     '''
     Read a single file
     '''
     log = logging.getLogger(__name__)
     log.info('Reading {}'.format(ifile))
-    tb = pd.read_csv(ifile,sep=",")
+    tb = pd.read_csv(ifile,sep=",",engine=_CSV_ENGINE)
     keys = list(tb.keys())
     tb = tb.rename(columns={keys[0]:'datetime'})
     # get dates
-    dates = [dt.datetime.strptime(i,"%Y-%m-%d %H:%M:%S") for i in tb['datetime']]
-    nrow = len(dates)
+    dates = pd.to_datetime(tb['datetime'],format='%Y-%m-%d %H:%M:%S',cache=True).to_numpy()
     # get variable information
     varunit = config.get('vars').get(spec).get('unit')
     varscal = config.get('vars').get(spec).get('scal')
-    # do for all locations
-    alldat = []
+    # do for all locations. Accumulate the columns as numpy arrays and build
+    # a single dataframe at the end, which avoids the overhead of one
+    # dataframe per location
+    cols = {k:[] for k in ('ISO8601','original_station_name','lat','lon','obstype','unit','value')}
     for c in tb.keys():
         if c in ['datetime','mean','std']:
             continue
         # get station info
-        name,lat,lon = _get_station(config,c,**kwargs)
+        name,lat,lon = _get_station(id_index,c,**kwargs)
         if name is None:
-            continue 
-        idf = pd.DataFrame()
-        idf['ISO8601'] = dates
-        idf['original_station_name'] = [name for i in range(nrow)] 
-        idf['lat'] = [lat for i in range(nrow)] 
-        idf['lon'] = [lon for i in range(nrow)] 
-        idf['obstype'] = [spec for i in range(nrow)]
-        idf['unit'] = [varunit for i in range(nrow)]
-        idf['value'] = [i*varscal for i in tb[c].values]
-        idf = idf.loc[~np.isnan(idf['value'])]
-        if idf.shape[0]>0:
-            alldat.append(idf)
+            continue
+        vals = tb[c].to_numpy(dtype=np.float64) * varscal
+        mask = ~np.isnan(vals)
+        nval = int(mask.sum())
+        if nval>0:
+            cols['ISO8601'].append(dates[mask])
+            cols['original_station_name'].append(np.full(nval,name,dtype=object))
+            cols['lat'].append(np.full(nval,lat))
+            cols['lon'].append(np.full(nval,lon))
+            cols['obstype'].append(np.full(nval,spec,dtype=object))
+            cols['unit'].append(np.full(nval,varunit,dtype=object))
+            cols['value'].append(vals[mask])
             if ofile_local is not None:
+                idf = pd.DataFrame({'ISO8601':dates[mask],
+                                    'original_station_name':name,
+                                    'lat':lat,
+                                    'lon':lon,
+                                    'obstype':spec,
+                                    'unit':varunit,
+                                    'value':vals[mask]})
                 ofile = ofile_local.replace('%l',name)
                 _ = cfobs_save(idf,ofile,dt.datetime(2018,1,1),append=ofile_local_append)
-    df = pd.concat(alldat) if len(alldat)>0 else None
+    if len(cols['value'])==0:
+        return EMPTY_SCHEMA.copy()
+    df = pd.DataFrame({k:np.concatenate(v) for k,v in cols.items()})
+    # store repeated strings as categoricals to save memory
+    for c in ('original_station_name','obstype','unit'):
+        df[c] = df[c].astype('category')
     return df
 
 
-def _get_station(config,id,default_lat=None,default_lon=None,prefix=None):
+def _build_station_index(config):
+    '''
+    Build a station ID -> (name,lat,lon) lookup from the configuration
+    so that station lookups are O(1) instead of a scan over all locations.
+    '''
+    locations = config.get('locations',{})
+    return {locations.get(l).get('id'):(l,locations.get(l).get('lat'),locations.get(l).get('lon')) for l in locations}
+
+
+def _get_station(id_index,id,default_lat=None,default_lon=None,prefix=None):
     '''
     Get station information for the given ID
     '''
     log = logging.getLogger(__name__)
-    locations = config.get('locations')
-    name = '_'.join((prefix,str(id))) if prefix is not None else None
-    lat = default_lat
-    lon = default_lon 
-    for l in locations:
-        if locations.get(l).get('id') == id:
-            name = l 
-            lat = locations.get(l).get('lat')
-            lon = locations.get(l).get('lon')
-            break
+    entry = id_index.get(id)
+    if entry is not None:
+        name,lat,lon = entry
+    else:
+        name = '_'.join((prefix,str(id))) if prefix is not None else None
+        lat = default_lat
+        lon = default_lon
     if name is None:
         log.warning('No station entry found for ID {}'.format(id))
         return None,None,None
-    if name is None or lat is None or lon is None:
+    if lat is None or lon is None:
         log.warning('At least one entry missing for station ID {}'.format(id))
         return None,None,None
     return name,lat,lon
@@ -24,37 +24,75 @@ import pytz
 import pandas as pd
 import yaml
 import glob
+from concurrent.futures import ThreadPoolExecutor
 
 from ..parse_string import parse_date
 from ..systools import load_config
 
+# use the multithreaded pyarrow csv engine if available
+try:
+    import pyarrow
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    _CSV_ENGINE = 'c'
+
 OBSTYPE_MAP = {
  'Ozono':'o3',
  'Particelle sospese PM2.5':'pm25',
  'Biossido di Azoto':'no2',
 }
 
+# typed empty frame returned when no valid data is found, so that downstream
+# code can rely on the columns being present
+EMPTY_SCHEMA = pd.DataFrame({'ISO8601':pd.Series(dtype='datetime64[ns, UTC]'),
+                             'localtime':pd.Series(dtype='datetime64[ns]'),
+                             'original_station_name':pd.Series(dtype='object'),
+                             'lon':pd.Series(dtype='float64'),
+                             'lat':pd.Series(dtype='float64'),
+                             'unit':pd.Series(dtype='object'),
+                             'obstype':pd.Series(dtype='object'),
+                             'value':pd.Series(dtype='float64')})
+
 
-def read_milan(iday=None,configfile='unknown',**kwargs):
+def read_milan(iday=None,configfile='unknown',nproc=1,**kwargs):
     '''
     Read AQ observations from Lombardy, Italy, as obtained from
-    https://www.arpalombardia.it/Pages/Aria/Richiesta-Dati.aspx 
+    https://www.arpalombardia.it/Pages/Aria/Richiesta-Dati.aspx
+    The files are independent of each other and are read in parallel
+    if nproc is larger than 1.
     '''
     log = logging.getLogger(__name__)
     # read configuration file
     config = load_config(configfile)
     # output array
-    dat = pd.DataFrame()
-    # get list of files 
+    frames = []
+    # get list of files
     files = config.get('input_files')
     if type(files)==type(""):
         files = [files]
     for ifiles in files:
         file_list = glob.glob(ifiles)
-        for ifile in file_list:
-            idat = _read_file ( config, ifile, **kwargs )
-            if idat is not None:
-                dat = dat.append(idat)
+        if nproc > 1:
+            with ThreadPoolExecutor(max_workers=nproc) as pool:
+                idats = list(pool.map(lambda f: _read_file(config,f,**kwargs),file_list))
+        else:
+            idats = [_read_file(config,ifile,**kwargs) for ifile in file_list]
+        frames.extend([i for i in idats if i is not None])
+    if len(frames)==0:
+        dat = EMPTY_SCHEMA.copy()
+    elif len(frames)==1:
+        dat = frames[0].reset_index(drop=True)
+    else:
+        dat = pd.concat(frames,ignore_index=True)
+    # sort once across all files. The individual files are already in time
+    # order, so the stable mergesort is close to linear here
+    if 'ISO8601' in dat:
+        dat = dat.sort_values(by='ISO8601',kind='mergesort')
+    # store repeated strings as categoricals to save memory. This is done
+    # after the concat across files so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit'):
+        if c in dat:
+            dat[c] = dat[c].astype('category')
     return dat
 
 
@@ -87,24 +125,21 @@ def _read_file(config,ifile,firstday=None,lastday=None,skipnan=True,remove_negat
     sunit = tmp[1].replace('\n','')
     sunit = 'ugm-3' if 'g/m' in sunit else sunit
     log.info('Read {} data (in units of {}) at location {}'.format(obstype,sunit,oname))
-    df = pd.read_csv(ifile,delimiter=',',skiprows=4,header=None,names=['ISO8601','value'],na_filter=False) #,parse_dates=['ISO8601'],date_parser=lambda x: pd.datetime.strptime(x, '%Y/%m/%d %H:%M'))
+    df = pd.read_csv(ifile,delimiter=',',skiprows=4,header=None,names=['ISO8601','value'],na_filter=False,engine=_CSV_ENGINE,dtype={'ISO8601':'string','value':'float64'})
     # parse dates. Different for PM2.5 and O3, NO2
     sfmt = '%Y/%m/%d %H:%M' if ':' in df['ISO8601'].values[0] else '%Y/%m/%d'
-    dates_local = [dt.datetime.strptime(i,sfmt) for i in df['ISO8601']]
-    # read dates and convert to UTC
-    milan = timezone('Europe/Rome')
-    utc = pytz.utc
-    dates_utc = [milan.localize(i).astimezone(utc) for i in dates_local]
+    dates_local = pd.to_datetime(df['ISO8601'],format=sfmt,cache=True)
+    # read dates and convert to UTC in one vectorized pass
+    dates_utc = pd.DatetimeIndex(dates_local).tz_localize('Europe/Rome',ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
     # output data
-    nrow = df.shape[0]
     idat = pd.DataFrame()
-    idat['ISO8601'] = dates_utc 
-    idat['localtime'] = dates_local 
-    idat['original_station_name'] = [oname for i in range(nrow)]
-    idat['lon'] = [slon for i in range(nrow)]
-    idat['lat'] = [slat for i in range(nrow)]
-    idat['unit'] = [sunit for i in range(nrow)]
-    idat['obstype'] = [obstype for i in range(nrow)]
+    idat['ISO8601'] = dates_utc
+    idat['localtime'] = dates_local
+    idat['original_station_name'] = oname
+    idat['lon'] = slon
+    idat['lat'] = slat
+    idat['unit'] = sunit
+    idat['obstype'] = obstype
     idat['value'] = df['value']
     # Scan for first/last entry
     if skipnan:
@@ -118,6 +153,5 @@ def _read_file(config,ifile,firstday=None,lastday=None,skipnan=True,remove_negat
     if lastday is not None:
         lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
         log.info('Only use data before {}'.format(lastday_tzaware))
-        ldat = ldat.loc[ldat['ISO8601'] < lastday_tzaware]
-    idat = idat.sort_values(by='ISO8601')
+        idat = idat.loc[idat['ISO8601'] < lastday_tzaware]
     return idat
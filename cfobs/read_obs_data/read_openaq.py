@@ -17,13 +17,55 @@
 # ****************************************************************************
 
 import os
+import functools
+import mmap
 import numpy as np
 import datetime as dt
 import pandas as pd
 import json
 import logging
 
-from ..parse_string import parse_date 
+# use the (much faster) orjson parser if available
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# compile the row-validation kernel with numba if available
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# use the multithreaded pyarrow csv engine if available
+try:
+    import pyarrow
+    _CSV_ENGINE = 'pyarrow'
+except ImportError:
+    _CSV_ENGINE = 'c'
+
+# use pyarrow's columnar ndjson reader if available
+try:
+    import pyarrow.json as pajson
+    import pyarrow.compute as pacompute
+except ImportError:
+    pajson = None
+
+from ..parse_string import parse_date
+
+# typed empty frame returned when no valid data is found, so that downstream
+# code can rely on the columns being present
+EMPTY_SCHEMA = pd.DataFrame({'ISO8601':pd.Series(dtype='datetime64[ns]'),
+                             'localtime':pd.Series(dtype='datetime64[ns]'),
+                             'original_station_name':pd.Series(dtype='object'),
+                             'country':pd.Series(dtype='object'),
+                             'lat':pd.Series(dtype='float64'),
+                             'lon':pd.Series(dtype='float64'),
+                             'obstype':pd.Series(dtype='object'),
+                             'unit':pd.Series(dtype='object'),
+                             'value':pd.Series(dtype='float64'),
+                             'source':pd.Series(dtype='object')})
 
 
 def read_openaq(iday,json_tmpl=None,csv_tmpl=None):
@@ -45,6 +87,10 @@ def read_openaq(iday,json_tmpl=None,csv_tmpl=None):
         csvfile = parse_date(csv_tmpl,iday)
         if os.path.isfile(csvfile):
             df,nlines,nerrs = read_openaq_csv(csvfile)
+    # sort once at the end. The files are already in near-time order, so the
+    # stable mergesort is close to linear here
+    if df is not None and df.shape[0]>0:
+        df = df.sort_values(by='ISO8601',kind='mergesort')
     log.info('Read: {:,}, thereof tossed: {:,}'.format(nlines,nerrs))
     return df
 
@@ -77,16 +123,38 @@ def get_unit(orig_unit):
     return unit
 
 
+def _valid_rows(val,lat,lon):
+    '''
+    Return a boolean mask of the rows with a valid (non-negative, finite)
+    value and finite coordinates.
+    '''
+    return (val>=0.0) & np.isfinite(val) & np.isfinite(lat) & np.isfinite(lon)
+
+if njit is not None:
+    _valid_rows = njit(cache=True)(_valid_rows)
+
+
+@functools.lru_cache(maxsize=131072)
+def _fast_iso(s):
+    '''
+    Parse a fixed-width ISO-8601 string ('YYYY-MM-DDTHH:MM:SS...') to a
+    datetime object. Much faster than strptime for this known format.
+    The cache pays off because the same timestamps repeat across stations.
+    '''
+    return dt.datetime(int(s[0:4]),int(s[5:7]),int(s[8:10]),
+                       int(s[11:13]),int(s[14:16]),int(s[17:19]))
+
+
 def read_json_line(line,dct):
     '''
-    Helper routine to read a line from the OpenAQ ndjson file. 
+    Helper routine to read a line from the OpenAQ ndjson file.
     '''
     err = 0
     # Read line
     try:
-        j = json.loads(line)
+        j = _json_loads(line)
     except:
-        err = 1 
+        err = 1
     # Get all values
     rc = 0
     if err==0:
@@ -95,20 +163,19 @@ def read_json_line(line,dct):
         par,rc = getv(j,"parameter",rc,type(u""))
         unt,rc = getv(j,"unit",rc,type(u""))
         val,rc = getv(j,"value",rc)
-        val    = np.float(val) if val is not None else None
         dat,rc = getv(j,"date",rc)
         if rc==0:
             utc,rc = getv(dat,"utc",rc)
             if rc==0:
                 try:
-                    utc_date = dt.datetime.strptime(utc,'%Y-%m-%dT%H:%M:%S.000Z')
+                    utc_date = _fast_iso(utc)
                 except:
                     utc_date = None
                     rc += 1
             lcl,rc = getv(dat,"local",rc)
             if rc==0:
                 try:
-                    lcl_date = dt.datetime.strptime(lcl[0:19],'%Y-%m-%dT%H:%M:%S')
+                    lcl_date = _fast_iso(lcl)
                 except:
                     lcl_date = None
                     rc += 1
@@ -127,17 +194,15 @@ def read_json_line(line,dct):
             src = ': '.join(['OpenAQ ndjson',src])
     if rc>0:
         err = 1
-    # don't allow negative values:
-    if err==0 and val < 0.0:
-        err = 1
-    # Populate dataframe 
+    # Populate dataframe. Negative values are tossed in a vectorized pass
+    # once all lines are read.
     if err==0:
         dct['ISO8601'].append(utc_date)
         dct['localtime'].append(lcl_date)
         dct['original_station_name'].append(loc)
         dct['country'].append(ctr)
-        dct['lat'].append(np.float(lat))
-        dct['lon'].append(np.float(lon))
+        dct['lat'].append(lat)
+        dct['lon'].append(lon)
         dct['obstype'].append(par)
         dct['unit'].append(get_unit(unt))
         dct['value'].append(val)
@@ -148,12 +213,82 @@ def read_json_line(line,dct):
     return dct,err
 
 
+def _read_ndjson_arrow(ifile):
+    '''
+    Reads an OpenAQ ndjson file with pyarrow's columnar json reader. This
+    parses the whole file at C level in one pass, which is much faster than
+    the line-by-line parser below. Returns None if the file does not match
+    the expected schema, in which case the caller falls back to the
+    line-by-line parser.
+    '''
+    log = logging.getLogger(__name__)
+    log.info('reading '+ifile)
+    try:
+        # keep the date strings as-is so that the local wall time is preserved;
+        # pin the value and coordinate types so that arrow does not have to
+        # infer them per block
+        schema = pyarrow.schema([('date',pyarrow.struct([('utc',pyarrow.string()),('local',pyarrow.string())])),
+                                 ('value',pyarrow.float64()),
+                                 ('coordinates',pyarrow.struct([('latitude',pyarrow.float64()),('longitude',pyarrow.float64())]))])
+        tbl = pajson.read_json(ifile,
+                               read_options=pajson.ReadOptions(block_size=64<<20),
+                               parse_options=pajson.ParseOptions(explicit_schema=schema))
+        # dictionary-encode the repeated string columns at arrow level, so they
+        # enter pandas as compact categoricals rather than python strings
+        df = pd.DataFrame({'ISO8601':pacompute.struct_field(tbl['date'],'utc').to_pandas(),
+                           'localtime':pacompute.struct_field(tbl['date'],'local').to_pandas(),
+                           'original_station_name':pacompute.dictionary_encode(tbl['location'].combine_chunks()).to_pandas(),
+                           'country':pacompute.dictionary_encode(tbl['country'].combine_chunks()).to_pandas(),
+                           'lat':pacompute.struct_field(tbl['coordinates'],'latitude').to_pandas(),
+                           'lon':pacompute.struct_field(tbl['coordinates'],'longitude').to_pandas(),
+                           'obstype':pacompute.dictionary_encode(tbl['parameter'].combine_chunks()).to_pandas(),
+                           'unit':pacompute.dictionary_encode(tbl['unit'].combine_chunks()).to_pandas(),
+                           'value':tbl['value'].to_pandas(),
+                          })
+    except Exception as e:
+        log.warning('pyarrow could not read {} - falling back to line-by-line parser ({})'.format(ifile,e))
+        return None
+    nline = tbl.num_rows
+    try:
+        src = pacompute.struct_field(pacompute.list_element(tbl['attribution'],0),'name').to_pandas().fillna('unknown')
+    except Exception:
+        src = 'unknown'
+    df['source'] = 'OpenAQ ndjson: ' + src
+    # parse the dates the same way as the line-by-line reader, i.e. drop any
+    # timezone information beyond the first 19 characters
+    df['ISO8601']   = pd.to_datetime(df['ISO8601'].str.slice(0,19),format='%Y-%m-%dT%H:%M:%S',errors='coerce',cache=True)
+    df['localtime'] = pd.to_datetime(df['localtime'].str.slice(0,19),format='%Y-%m-%dT%H:%M:%S',errors='coerce',cache=True)
+    u = df['unit'].astype(str)
+    df['unit'] = np.select([u.str.contains('g/m'),u.str.contains('ppb'),u.str.contains('ppm')],
+                           ['ugm-3','ppbv','ppmv'],default='')
+    # toss rows with missing entries, negative values or invalid coordinates
+    val = pd.to_numeric(df['value'],errors='coerce').to_numpy(dtype=np.float64)
+    lat = pd.to_numeric(df['lat'],errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['lon'],errors='coerce').to_numpy(dtype=np.float64)
+    mask = _valid_rows(val,lat,lon) \
+           & df['ISO8601'].notna().values & df['localtime'].notna().values \
+           & df['original_station_name'].notna().values & df['obstype'].notna().values
+    nerr = int(nline - mask.sum())
+    df = df.loc[mask]
+    if df.shape[0]>0:
+        df['original_station_name'] = df['original_station_name'].str.replace(" ","",regex=False)
+    # store repeated strings as categoricals to save memory
+    for c in ('original_station_name','country','obstype','unit'):
+        df[c] = df[c].astype('category')
+    return df,nline,nerr
+
+
 def read_openaq_ndjson(ifile):
     '''
     Reads an OpenAQ ndjson file and writes its content to a data frame.
     '''
 
     log = logging.getLogger(__name__)
+    # use the (much faster) columnar pyarrow reader if possible
+    if pajson is not None:
+        res = _read_ndjson_arrow(ifile)
+        if res is not None:
+            return res
     # read data into dictionary
     dct = dict({'ISO8601':[],
                 'localtime':[],
@@ -169,21 +304,35 @@ def read_openaq_ndjson(ifile):
     nline = 0
     nerr  = 0
     log.info('reading '+ifile)
-    with open(ifile,"r",encoding="ISO-8859-1") as f:
-        for line in f:
-            nline += 1
-            dct,err = read_json_line(line,dct)
-            nerr += err 
-            log.debug('tossed: '+line)
-    # pass to dataframe
-    df = pd.DataFrame()
+    # iterate over the raw bytes via mmap. The json parser accepts bytes
+    # directly, which skips the per-line text decode of regular file iteration
+    if os.path.getsize(ifile)>0:
+        with open(ifile,"rb") as f:
+            mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            for line in iter(mm.readline,b''):
+                if not line.strip():
+                    continue
+                nline += 1
+                dct,err = read_json_line(line,dct)
+                nerr += err
+                log.debug('tossed: {}'.format(line))
+            mm.close()
+    # pass to dataframe. The values were buffered without casting, so convert
+    # the numeric columns to float64 in one pass each
+    df = EMPTY_SCHEMA.copy()
     if len(dct['ISO8601'])>0:
-        for k,v in zip(dct.keys(),dct.values()):
-            df[k] = v
-        # sort data
-        df = df.sort_values(by="ISO8601")
+        for k in ('value','lat','lon'):
+            dct[k] = np.asarray(dct[k],dtype=np.float64)
+        df = pd.DataFrame(dct,copy=False)
+        # don't allow negative values:
+        mask = _valid_rows(df['value'].values,df['lat'].values,df['lon'].values)
+        nerr += int((~mask).sum())
+        df = df.loc[mask]
         # strip empty spaces
-        df['original_station_name'] = [i.replace(" ","") for i in df['original_station_name']]
+        df['original_station_name'] = df['original_station_name'].str.replace(' ','',regex=False)
+        # store repeated strings as categoricals to save memory
+        for c in ('original_station_name','country','obstype','unit'):
+            df[c] = df[c].astype('category')
     return df,nline,nerr
 
 
@@ -193,26 +342,34 @@ def read_openaq_csv(ifile):
     '''
     log = logging.getLogger(__name__)
     log.info('reading {}'.format(ifile))
-    ds = pd.read_csv(ifile,sep=",")
-    # pass to dataframe
+    # Note: the pyarrow engine cannot be used here since it would re-parse
+    # (and normalize) the utc/local date strings before the dtype cast.
+    ds = pd.read_csv(ifile,sep=",",engine='c',low_memory=False,cache_dates=True,
+                     dtype={'utc':'string','local':'string','latitude':'float64','longitude':'float64',
+                            'value':'float64','location':'string','country':'string','parameter':'string','unit':'string'})
+    # pass to dataframe, using vectorized column operations throughout
     df = pd.DataFrame()
-    df['ISO8601']   = [dt.datetime.strptime(i,'%Y-%m-%dT%H:%M:%S.000Z') for i in ds['utc']]
-    df['localtime'] = [dt.datetime.strptime(i[0:19],'%Y-%m-%dT%H:%M:%S') for i in ds['local']]
-    df['original_station_name'] = ds['location'] 
+    df['ISO8601']   = pd.to_datetime(ds['utc'],format='%Y-%m-%dT%H:%M:%S.000Z',cache=True)
+    df['localtime'] = pd.to_datetime(ds['local'].str[0:19],format='%Y-%m-%dT%H:%M:%S',cache=True)
+    df['original_station_name'] = ds['location']
     df['country']   = ds['country']
-    df['lat']       = [np.float(i) for i in ds['latitude']]
-    df['lon']       = [np.float(i) for i in ds['longitude']]
+    df['lat']       = ds['latitude'].astype(np.float64)
+    df['lon']       = ds['longitude'].astype(np.float64)
     df['obstype']   = ds['parameter']
-    df['unit']      = [get_unit(i) for i in ds['unit']]
-    df['value']     = [np.float(i) for i in ds['value']]
-    df['source']    = ['OpenAQ csv: '+i.split('"name":')[1].split(',')[0] if type(i)==type('') else 'OpenAQ csv' for i in ds['attribution']]
+    u = ds['unit'].astype(str)
+    df['unit']      = np.select([u.str.contains('g/m'),u.str.contains('ppb'),u.str.contains('ppm')],
+                                ['ugm-3','ppbv','ppmv'],default='')
+    df['value']     = ds['value'].astype(np.float64)
+    src = ds['attribution'].str.split('"name":',n=1).str[1].str.split(',',n=1).str[0]
+    df['source']    = np.where(src.notna(),'OpenAQ csv: '+src.fillna(''),'OpenAQ csv')
     # cleanup
     nline = df.shape[0]
     nerr  = 0
     if nline>0:
-        # sort data
-        df = df.sort_values(by="ISO8601")
         # strip empty spaces
-        df['original_station_name'] = [i.replace(" ","") for i in df['original_station_name']]
+        df['original_station_name'] = df['original_station_name'].str.replace(' ','',regex=False)
+        # store repeated strings as categoricals to save memory
+        for c in ('original_station_name','country','obstype','unit'):
+            df[c] = df[c].astype('category')
     return df,nline,nerr
 
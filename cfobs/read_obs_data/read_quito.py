@@ -37,12 +37,19 @@ def read_quito(iday=None,configfile='unknown',**kwargs):
     # read configuration file
     config = load_config(configfile)
     # output array
-    dat = pd.DataFrame()
+    frames = []
     # read file for every variable
     vars = config.get('vars')
     for var in vars:
         idat = _read_file ( config, var, **kwargs )
-        dat = dat.append(idat)
+        if idat is not None:
+            frames.append(idat)
+    dat = pd.concat(frames,ignore_index=True) if len(frames)>0 else pd.DataFrame()
+    # store repeated strings as categoricals to save memory. This is done
+    # after the concat across variables so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit'):
+        if c in dat:
+            dat[c] = dat[c].astype('category')
     return dat
 
 
@@ -50,8 +57,9 @@ def _read_file(config,var,firstday=None,lastday=None,skipnan=True,remove_negativ
     '''Read individual file.'''
     log = logging.getLogger(__name__)
     idat = pd.DataFrame()
-    varname = config.get('vars').get(var).get('name_on_file',var)
-    varunit = config.get('vars').get(var).get('unit')
+    varcfg = config.get('vars').get(var)
+    varname = varcfg.get('name_on_file',var)
+    varunit = varcfg.get('unit')
     # open file and parse Excel
     ifile_template = config.get('ifile_template','unknown')
     ifile = ifile_template.replace('%v',varname)
@@ -59,55 +67,65 @@ def _read_file(config,var,firstday=None,lastday=None,skipnan=True,remove_negativ
         log.warning('file not found: {}'.format(ifile))
         return None
     log.info('Reading {}'.format(ifile))
-    xl = pd.ExcelFile(ifile)
-    df = xl.parse(xl.sheet_names[0])
+    # stream the workbook with openpyxl in read-only mode and only parse the
+    # date column plus the configured locations. This avoids building the
+    # full worksheet in memory
+    locations_cfg = config.get('locations')
+    hdr = pd.read_excel(ifile,sheet_name=0,engine='openpyxl',
+                        engine_kwargs={'read_only':True,'data_only':True},nrows=0)
+    wanted = [hdr.keys()[0]] + [c for c in hdr.keys()[1:] if c in locations_cfg]
+    df = pd.read_excel(ifile,sheet_name=0,engine='openpyxl',
+                       engine_kwargs={'read_only':True,'data_only':True},usecols=wanted)
     # read dates and convert to UTC
-    quito = timezone('America/Bogota')
-    utc = pytz.utc
     datecol = df.keys()[0]
-    dates_local_orig = df[datecol].values[1:]
-    dates_local = [dt.datetime(i.year,i.month,i.day,i.hour,0,0) for i in dates_local_orig]
-    #dates_utc = [quito.localize(i).astimezone(utc) for i in dates_local]
+    dates_local = pd.DatetimeIndex(df[datecol].values[1:]).floor('h')
+    # apply the firstday/lastday window once, up front - it is identical for
+    # every location and doing it here keeps all downstream passes small
+    dates_utc = pd.DatetimeIndex(dates_local).tz_localize('America/Bogota',ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
+    keep = np.ones(dates_local.shape[0],dtype=bool)
+    if firstday is not None:
+        firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
+        log.info('Only use data after {}'.format(firstday_tzaware))
+        keep &= (dates_utc >= firstday_tzaware)
+    if lastday is not None:
+        lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
+        log.info('Only use data before {}'.format(lastday_tzaware))
+        keep &= (dates_utc < lastday_tzaware)
+    dates_local = dates_local[keep]
     # accumulate data by location in dataframe
-    idat = pd.DataFrame()
-    for iloc in config.get('locations'):
+    parts = []
+    for iloc,loccfg in locations_cfg.items():
         if iloc not in df.keys():
             log.warning('Location "{}" not found in file - will skip it'.format(iloc))
             continue
-        station_name = config.get('locations').get(iloc).get('name',iloc)
-        lat = config.get('locations').get(iloc).get('lat',np.nan)
-        lon = config.get('locations').get(iloc).get('lon',np.nan)
+        station_name = loccfg.get('name',iloc)
+        lat = loccfg.get('lat',np.nan)
+        lon = loccfg.get('lon',np.nan)
         log.info('Parsing {} (name={}; lat={}, lon={})'.format(iloc,station_name,lat,lon))
         tmpdat = pd.DataFrame()
         tmpdat['localtime'] = dates_local
-        values_as_char = [ str(i).replace(' ','') for i in df[iloc].values[1:] ]
-        tmpdat['value'] = [ np.nan if i=='' else np.float(i) for i in values_as_char ]
+        # strip spaces and parse the values in one vectorized pass; empty or
+        # invalid entries become NaN
+        values_as_char = df[iloc].iloc[1:].astype(str).str.replace(' ','',regex=False)
+        tmpdat['value'] = pd.to_numeric(values_as_char,errors='coerce').to_numpy()[keep]
         ldat = tmpdat.groupby('localtime').mean().reset_index()
-        ldat['ISO8601'] = [quito.localize(i).astimezone(utc) for i in ldat.localtime]
+        # convert to UTC in one vectorized pass
+        ldat['ISO8601'] = pd.DatetimeIndex(ldat['localtime']).tz_localize('America/Bogota',ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
         if skipnan:
             ldat = ldat.loc[~np.isnan(ldat.value)]
         if remove_negatives:
             ldat = ldat.loc[ldat.value>=0.0]
-        if firstday is not None:
-            firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
-            log.info('Only use data after {}'.format(firstday_tzaware))
-            ldat = ldat.loc[ldat['ISO8601'] >= firstday_tzaware]
-        if lastday is not None:
-            lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
-            log.info('Only use data before {}'.format(lastday_tzaware))
-            ldat = ldat.loc[ldat['ISO8601'] < lastday_tzaware]
-        nrow = ldat.shape[0]
-        ldat['original_station_name'] = [station_name for i in range(nrow)]
-        ldat['lat'] = [lat for i in range(nrow)]
-        ldat['lon'] = [lon for i in range(nrow)]
+        ldat['original_station_name'] = station_name
+        ldat['lat'] = lat
+        ldat['lon'] = lon
         # add to data frame
-        idat = idat.append(ldat)
+        parts.append(ldat)
+    idat = pd.concat(parts,ignore_index=True) if len(parts)>0 else pd.DataFrame()
     # add species information
     idat = idat.sort_values(by='ISO8601')
-    nrow_full = idat.shape[0]
-    idat['obstype'] = [var for i in range(nrow_full)]
+    idat['obstype'] = var
     if varunit=='mgm-3':
         idat['value'] = idat['value'].values*1.0e3
         varunit='ugm-3'
-    idat['unit'] = [varunit for i in range(nrow_full)]
+    idat['unit'] = varunit
     return idat
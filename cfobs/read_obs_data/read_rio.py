@@ -37,26 +37,22 @@ def read_rio(iday=None,configfile=None,type='api',firstday=None,lastday=None,**k
     log = logging.getLogger(__name__)
     config = load_config(configfile)
     if type=='api':
-        df = read_rio_api(iday,config,**kwargs)
+        df = read_rio_api(iday,config,firstday=firstday,lastday=lastday,**kwargs)
     if type=='bruno':
-        df = read_rio_bruno(iday,config,**kwargs)
-    # filter by days
-    if firstday is not None:
-        firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
-        log.info('Only use data after {}'.format(firstday_tzaware))
-        df = df.loc[df['ISO8601'] >= firstday_tzaware]
-    if lastday is not None:
-        lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
-        log.info('Only use data before {}'.format(lastday_tzaware))
-        df = df.loc[df['ISO8601'] < lastday_tzaware]
-    # map station names 
-    for iloc in config.get('locations'):
-        longname = config.get('locations').get(iloc).get('longname',iloc)
-        df['original_station_name'] = [longname if x==iloc else x for x in df['original_station_name'].values]
+        df = read_rio_bruno(iday,config,firstday=firstday,lastday=lastday,**kwargs)
+    # map station names in a single vectorized pass; names without a
+    # configured longname are kept as-is
+    name_map = {iloc:loccfg.get('longname',iloc) for iloc,loccfg in config.get('locations').items()}
+    df['original_station_name'] = df['original_station_name'].map(name_map).fillna(df['original_station_name'])
+    # store repeated strings as categoricals to save memory. This is done
+    # at the very end so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit'):
+        if c in df:
+            df[c] = df[c].astype('category')
     return df
 
 
-def read_rio_api(iday,config,time_offset=0):
+def read_rio_api(iday,config,time_offset=0,firstday=None,lastday=None):
     '''
     Read AQ observations from Rio de Janeiro, as obtained from
     data.rio/datasets/dados-horarios-do-monitoramento-da-qualidade-do-ar-monitorar/data
@@ -69,35 +65,46 @@ def read_rio_api(iday,config,time_offset=0):
         return None
     log.info('Reading {}'.format(ifile))
     tb = pd.read_csv(ifile,sep=",") ##,encoding="ISO-8859-1")
-    # get dates
-    offset = dt.timedelta(minutes=time_offset)
-    #local_time = [dt.datetime.strptime(i,"%Y-%m-%dT%H:%M:00.000Z")+offset for i in tb['Data']]
-    local_time = [dt.datetime.strptime(i,"%Y/%m/%d %H:%M:00+00")+offset for i in tb['Data']]
-    rio = timezone('America/Buenos_Aires')
-    utc = pytz.utc
-    dates = [rio.localize(i).astimezone(utc) for i in local_time]
+    # get dates. The format is fixed, so one vectorized parse with caching
+    # replaces the per-row strptime
+    local_time = pd.to_datetime(tb['Data'],format="%Y/%m/%d %H:%M:00+00",cache=True) + pd.Timedelta(minutes=time_offset)
+    # convert to UTC in one vectorized pass
+    dates = pd.DatetimeIndex(local_time).tz_localize('America/Buenos_Aires',ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
     tb['ISO8601'] = dates
-    tb['local_time'] = local_time 
-    # output dataframe 
-    df = pd.DataFrame()
+    tb['local_time'] = local_time
+    # filter by days right after the date parse, before the per-variable
+    # value parsing and frame construction below
+    if firstday is not None:
+        firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
+        log.info('Only use data after {}'.format(firstday_tzaware))
+        tb = tb.loc[tb['ISO8601'] >= firstday_tzaware]
+    if lastday is not None:
+        lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
+        log.info('Only use data before {}'.format(lastday_tzaware))
+        tb = tb.loc[tb['ISO8601'] < lastday_tzaware]
     # read values and add to dataframe
-    nrow = tb.shape[0]
+    parts = []
     vars = config.get('vars')
-    for v in vars:
-        name_on_file = vars.get(v).get('name_on_file',v)
+    for v,varcfg in vars.items():
+        name_on_file = varcfg.get('name_on_file',v)
         idf = pd.DataFrame()
         idf['ISO8601'] = tb['ISO8601']
-        idf['obstype'] = [v for x in range(nrow)]
-        idf['unit'] = [vars.get(v).get('unit','NaN') for x in range(nrow)]
-        idf['value'] = [np.float(str(x).replace(",",".")) for x in tb[name_on_file].values]
+        idf['obstype'] = v
+        idf['unit'] = varcfg.get('unit','NaN')
+        # values may use a comma as decimal separator - fix in one vectorized pass
+        col = tb[name_on_file]
+        if not pd.api.types.is_numeric_dtype(col):
+            col = col.astype(str).str.replace(',','.',regex=False)
+        idf['value'] = pd.to_numeric(col,errors='coerce').to_numpy()
         idf['lat'] = tb['Lat'].values
         idf['lon'] = tb['Lon'].values
         idf['original_station_name'] = tb['Estação'].values
-        df = df.append(idf)
+        parts.append(idf)
+    df = pd.concat(parts,ignore_index=True) if len(parts)>0 else pd.DataFrame()
     return df
 
 
-def read_rio_bruno(iday,config,ifiles='unknown',time_offset=0):
+def read_rio_bruno(iday,config,ifiles='unknown',time_offset=0,firstday=None,lastday=None):
     '''
     Reads and merges the AQ observations from Rio de Janeiro, as prepared by 
     Felipe Mandarino (felipe.mandarino@rio.rj.gov.br) / Bruno Franca.
@@ -108,58 +115,80 @@ def read_rio_bruno(iday,config,ifiles='unknown',time_offset=0):
     if len(files)==0:
         log.warning('No files found: {}'.format(ifile_template))
         return
-    # read all files and write to data frame 
-    df = pd.DataFrame()
+    # read all files and write to data frame
+    parts = []
     for ifile in files:
-        idf = _read_file_bruno(ifile,config,time_offset)
-        if idf.shape[0] > 0: 
-            df = df.append(idf)
-    # sort data
-    df = df.sort_values(by="ISO8601")
+        idf = _read_file_bruno(ifile,config,time_offset,firstday,lastday)
+        if idf.shape[0] > 0:
+            parts.append(idf)
+    df = pd.concat(parts,ignore_index=True) if len(parts)>0 else pd.DataFrame()
+    # sort data. The day window may have dropped all rows, in which case
+    # there is nothing to sort
+    if 'ISO8601' in df:
+        df = df.sort_values(by="ISO8601")
     return df
 
 
-def _read_file_bruno(ifile,config,time_offset):
+def _read_file_bruno(ifile,config,time_offset,firstday=None,lastday=None):
     '''
     Read a single file as prepared by Bruno Franca'
     '''
     log = logging.getLogger(__name__)
     log.info('reading {}'.format(ifile))
-    tb = pd.read_csv(ifile,sep=";",encoding="ISO-8859-1")
+    # the values use a comma as decimal separator - let the csv parser handle
+    # the conversion during ingest
+    tb = pd.read_csv(ifile,sep=";",encoding="ISO-8859-1",decimal=",")
     nrow = tb.shape[0]
     # output dataframe 
     df = pd.DataFrame()
-    # get dates
-    offset = dt.timedelta(minutes=time_offset)
-    local_time = [dt.datetime.strptime(i,"%d/%m/%Y %H:%M")+offset for i in tb['Data']]
-    rio = timezone('America/Buenos_Aires')
-    utc = pytz.utc
-    dates = [rio.localize(i).astimezone(utc) for i in local_time]
+    # get dates. The format is fixed, so one vectorized parse with caching
+    # replaces the per-row strptime
+    local_time = pd.to_datetime(tb['Data'],format="%d/%m/%Y %H:%M",cache=True) + pd.Timedelta(minutes=time_offset)
+    # convert to UTC in one vectorized pass
+    dates = pd.DatetimeIndex(local_time).tz_localize('America/Buenos_Aires',ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
+    # filter by days right after the date parse, before the per-variable
+    # value parsing and frame construction below
+    keep = np.ones(dates.shape[0],dtype=bool)
+    if firstday is not None:
+        firstday_tzaware = dt.datetime(firstday.year,firstday.month,firstday.day,tzinfo=pytz.utc)
+        log.info('Only use data after {}'.format(firstday_tzaware))
+        keep &= (dates >= firstday_tzaware)
+    if lastday is not None:
+        lastday_tzaware = dt.datetime(lastday.year,lastday.month,lastday.day,tzinfo=pytz.utc)
+        log.info('Only use data before {}'.format(lastday_tzaware))
+        keep &= (dates < lastday_tzaware)
+    if not keep.all():
+        tb = tb.loc[keep]
+        dates = dates[keep]
+        local_time = local_time[keep]
     # get station information
-    sname = tb[tb.keys()[-1]][0]
+    sname = tb[tb.keys()[-1]].iloc[0] if tb.shape[0]>0 else None
     locations = config.get('locations')
     if sname not in locations:
         log.warning('Location not found in config - skip: {}'.format(sname))
-        return df 
-    slat = locations.get(sname).get('lat')
-    slon = locations.get(sname).get('lon')
+        return df
+    loccfg = locations.get(sname)
+    slat = loccfg.get('lat')
+    slon = loccfg.get('lon')
     # read values and add to dataframe
+    parts = []
     vars = config.get('vars')
-    for v in vars:
-        vname = vars.get(v).get('name_on_file')
+    for v,varcfg in vars.items():
+        vname = varcfg.get('name_on_file')
         if vname not in tb:
             log.warning('Variable not found in data - cannot read it: {}'.format(vname))
             continue
-        vunit = vars.get(v).get('unit')
+        vunit = varcfg.get('unit')
         idf = pd.DataFrame()
         idf['ISO8601'] = dates
-        idf['local_time'] = local_time 
-        idf['original_station_name'] = [sname for i in range(nrow)]
-        idf['lat'] = [slat for i in range(nrow)]
-        idf['lon'] = [slon for i in range(nrow)]
-        idf['obstype'] = [v for i in range(nrow)]
-        idf['unit'] = [vunit for i in range(nrow)]
-        idf['value'] = [np.float(str(i).replace(",",".")) for i in tb[vname].values]
-        df = df.append(idf)
+        idf['local_time'] = local_time.values
+        idf['original_station_name'] = sname
+        idf['lat'] = slat
+        idf['lon'] = slon
+        idf['obstype'] = v
+        idf['unit'] = vunit
+        idf['value'] = pd.to_numeric(tb[vname],errors='coerce').to_numpy()
+        parts.append(idf)
+    df = pd.concat(parts,ignore_index=True) if len(parts)>0 else df
     return df
 
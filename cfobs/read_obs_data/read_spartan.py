@@ -15,8 +15,10 @@
 
 # requirements
 import logging
-import os 
+import os
+import re
 import glob
+from concurrent.futures import ThreadPoolExecutor
 import argparse
 import numpy as np
 import datetime as dt
@@ -24,35 +26,110 @@ import pytz
 import pandas as pd
 import yaml
  
+from functools import lru_cache
+
 from ..regions import get_timezone
 
-def read_spartan(iday=None,ifiles='unknown',**kwargs):
+
+# date embedded in the filename, as YYYYMMDD
+_FILEDATE = re.compile(r'(\d{8})')
+
+
+def _filename_in_window(ifile,firstday,lastday):
+    '''
+    Check if the date embedded in the filename (YYYYMMDD) falls inside the
+    firstday/lastday window, padded by one day to allow for timezone shifts.
+    Files without a parseable date always pass.
+    '''
+    match = _FILEDATE.search(os.path.basename(ifile))
+    if match is None:
+        return True
+    try:
+        filedate = dt.datetime.strptime(match.group(1),'%Y%m%d')
+    except ValueError:
+        return True
+    if firstday is not None and filedate < dt.datetime(firstday.year,firstday.month,firstday.day)-dt.timedelta(days=1):
+        return False
+    if lastday is not None and filedate >= dt.datetime(lastday.year,lastday.month,lastday.day)+dt.timedelta(days=1):
+        return False
+    return True
+
+
+@lru_cache(maxsize=4096)
+def _tz_cached(lat_r,lon_r):
+    '''
+    Cache the timezone lookups, which involve an expensive point-in-polygon
+    query, so that each unique station location only pays for it once.
+    '''
+    return get_timezone(lat_r,lon_r)
+
+
+def read_spartan(iday=None,ifiles='unknown',nproc=1,**kwargs):
     '''
-    Read observations downloaded from the SPARTAN global 
+    Read observations downloaded from the SPARTAN global
     particulate matter network (https://spartan-network.org/)
+    The files are independent of each other and are read in parallel
+    if nproc is larger than 1.
     '''
     log = logging.getLogger(__name__)
-    # files to read 
+    # files to read
     files = glob.glob(ifiles)
     if len(files)==0:
         log.warning('No files found in {}'.format(ifiles))
         return None
-    df = pd.DataFrame()
-    # read all files
-    for ifile in files:
-        idf = _read_single_file(ifile,**kwargs)
-        if idf is not None:
-            df = df.append(idf)
-    df = df.sort_values(by="ISO8601")
+    # skip files whose filename-encoded date is outside the requested window,
+    # which avoids reading them at all
+    firstday = kwargs.get('firstday')
+    lastday = kwargs.get('lastday')
+    if firstday is not None or lastday is not None:
+        nall = len(files)
+        files = [f for f in files if _filename_in_window(f,firstday,lastday)]
+        if len(files) < nall:
+            log.info('Skip {} of {} files based on filename date'.format(nall-len(files),nall))
+    # read all files, memoized by file path and modification time
+    reader = lambda f: _read_single_file_cached(f,os.path.getmtime(f),firstday,lastday)
+    if nproc > 1:
+        with ThreadPoolExecutor(max_workers=nproc) as pool:
+            idfs = list(pool.map(reader,files))
+    else:
+        idfs = [reader(ifile) for ifile in files]
+    parts = [i for i in idfs if i is not None]
+    df = pd.concat(parts,ignore_index=True) if len(parts)>0 else pd.DataFrame()
+    # all files may have been skipped or invalid, in which case there is
+    # nothing to sort
+    if 'ISO8601' in df:
+        df = df.sort_values(by="ISO8601")
+    # store repeated strings as categoricals to save memory. This is done
+    # after the concat across files so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit','source'):
+        if c in df:
+            df[c] = df[c].astype('category')
     return df
 
 
+@lru_cache(maxsize=256)
+def _read_single_file_cached(ifile,mtime,firstday,lastday):
+    '''Memoize repeated reads of the same (unmodified) file.'''
+    return _read_single_file(ifile,firstday=firstday,lastday=lastday)
+
+
 def _read_single_file(ifile,firstday=None,lastday=None):
     '''Read a single WDCGG file.'''
     source = 'SPARTAN network'
     log = logging.getLogger(__name__)
     log.info('Reading {}'.format(ifile))
-    ds = pd.read_csv(ifile,skiprows=1)
+    # only parse the columns that are actually used, with categorical dtypes
+    # for the repeated strings. The wanted columns are intersected with the
+    # file header so files with missing columns still go through the
+    # per-column warnings below
+    cols = ['City','Latitude','Longitude','Year_local','Month_local','Day_local',
+            'hour_local','Value','Units','Parameter_Name']
+    dtypes = {'City':'category','Units':'category','Parameter_Name':'category',
+              'Year_local':'int16','Month_local':'int8','Day_local':'int8','hour_local':'int8'}
+    avail = pd.read_csv(ifile,skiprows=1,nrows=0).keys()
+    usecols = [c for c in cols if c in avail]
+    ds = pd.read_csv(ifile,skiprows=1,usecols=usecols,
+                     dtype={k:v for k,v in dtypes.items() if k in usecols},engine='c')
     # extract fields 
     if 'City' not in ds.keys():
         log.warning('keyword "City" is missing in {} - skip file'.format(ifile))
@@ -72,64 +149,69 @@ def _read_single_file(ifile,firstday=None,lastday=None):
         log.warning('keyword "Value" is missing in {} - skip file'.format(ifile))
     if 'Units' not in ds.keys():
         log.warning('keyword "Units" is missing in {} - skip file'.format(ifile))
-    # get lat & lon first, needed to convert to UTC time
-    lats = ds['Latitude'].values
-    lons = ds['Longitude'].values
-    if len(np.unique(lats)) > 1:
+    # get lat & lon first, needed to convert to UTC time. Use the hash-based
+    # Series.mode to pick the most common value in a single pass
+    if ds['Latitude'].nunique() > 1:
         log.warning('More than one latitude value found - will use most common value for all entries')
-    lat = max(set(list(lats)),key=list(lats).count)
-    if len(np.unique(lons)) > 1:
+    lat = ds['Latitude'].mode(dropna=True).iat[0]
+    if ds['Longitude'].nunique() > 1:
         log.warning('More than one longitude value found - will use most common value for all entries')
-    lon = max(set(list(lons)),key=list(lons).count)
+    lon = ds['Longitude'].mode(dropna=True).iat[0]
     # station name
-    names = list(ds['City'].values)
-    if len(np.unique(names)) > 1:
+    if ds['City'].nunique() > 1:
         log.warning('More than one station name value found - will use most common value for all entries')
-    name = max(set(list(names)),key=list(names).count)
+    name = ds['City'].mode(dropna=True).iat[0]
     # extract (local) date and time
     year = ds['Year_local'].values
     month = ds['Month_local'].values
     day = ds['Day_local'].values
     hour = ds['hour_local'].values
-    dates_local = [dt.datetime(y,m,d,h,0,0) for y,m,d,h in zip(year,month,day,hour)] 
-    # convert to UTC
-    this_timezone = get_timezone(lat,lon)
-    localtz = pytz.timezone(this_timezone)
+    # assemble the dates in one vectorized call
+    dates_local = pd.to_datetime(pd.DataFrame({'year':year,'month':month,'day':day,'hour':hour}))
+    # convert to UTC in one vectorized pass
+    this_timezone = _tz_cached(round(float(lat),3),round(float(lon),3))
     log.debug('Location,timezone: {},{}'.format(name,this_timezone))
     utc = pytz.utc
-    dates = [localtz.localize(i).astimezone(utc) for i in dates_local]
+    dates_local = pd.DatetimeIndex(dates_local)
+    dates = dates_local.tz_localize(this_timezone,ambiguous='NaT',nonexistent='shift_forward').tz_convert('UTC')
+    # reduce to the specified time range right after the date conversion, so
+    # that the value/unit extraction and frame construction below only touch
+    # rows that are kept
+    keep = np.ones(dates.shape[0],dtype=bool)
+    if firstday is not None:
+        log.debug('Only use data after {}'.format(firstday))
+        keep &= (dates >= utc.localize(firstday))
+    if lastday is not None:
+        log.debug('Only use data before {}'.format(lastday))
+        keep &= (dates < utc.localize(lastday))
+    if not keep.all():
+        ds = ds.loc[keep]
+        dates = dates[keep]
+        dates_local = dates_local[keep]
     nrow = len(dates)
     # Extract values and units
     values = ds['Value'].values
-    units = ds['Units'].values 
-    if len(np.unique(units)) > 1:
+    units = ds['Units'].values
+    if ds['Units'].nunique() > 1:
         log.warning('More than one unit value found - will use most common value for all entries')
-    unit = max(set(list(units)),key=list(units).count)
+    unit = ds['Units'].mode(dropna=True).iat[0]
     unit = 'ugm-3' if 'Micrograms per cubic meter' in unit else unit
     log.debug('Will use unit: {}'.format(unit))
     # Extract obstype
     if 'Parameter_Name' not in ds.keys():
         log.warning('keyword "Parameter_Name" is missing in {} - will set it to "pm25"')
-        obstypes = ["pm25" for i in range(nrow)]
+        obstypes = "pm25"
     else:
         obstypes = ds['Parameter_Name'].values 
         obstypes = ['pm25' if 'Estimated PM2.5 mass' in i else i for i in obstypes]
-    # Set output dataframe 
-    idf = pd.DataFrame()
-    idf['ISO8601'] = dates
-    idf['localtime'] = dates_local
-    idf['original_station_name'] = [name for i in range(nrow)] 
-    idf['lat'] = [lat for i in range(nrow)] 
-    idf['lon'] = [lon for i in range(nrow)] 
-    idf['obstype'] = obstypes 
-    idf['unit'] = units
-    idf['value'] = values
-    idf['source'] = [source for i in range(nrow)]
-    # Eventually reduce to specified time range
-    if firstday is not None:
-        log.debug('Only use data after {}'.format(firstday))
-        idf = idf.loc[idf['ISO8601'] >= utc.localize(firstday)]
-    if lastday is not None:
-        log.debug('Only use data before {}'.format(lastday))
-        idf = idf.loc[idf['ISO8601'] < utc.localize(lastday)]
+    # Set output dataframe in a single construction; scalars broadcast
+    idf = pd.DataFrame({'ISO8601':dates,
+                        'localtime':dates_local,
+                        'original_station_name':name,
+                        'lat':lat,
+                        'lon':lon,
+                        'obstype':obstypes,
+                        'unit':units,
+                        'value':values,
+                        'source':source})
     return idf
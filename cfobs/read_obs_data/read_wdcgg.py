@@ -15,8 +15,11 @@
 
 # requirements
 import logging
-import os 
+import os
+import re
 import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import argparse
 import numpy as np
 import datetime as dt
@@ -25,11 +28,36 @@ import pytz
 import pandas as pd
 import yaml
 
+# date embedded in the filename, as YYYYMMDD
+_FILEDATE = re.compile(r'(\d{8})')
 
-def read_wdcgg(iday=None,ifiles='unknown',**kwargs):
+
+def _filename_in_window(ifile,firstday,lastday):
+    '''
+    Check if the date embedded in the filename (YYYYMMDD) falls inside the
+    firstday/lastday window, padded by one day to allow for timezone shifts.
+    Files without a parseable date always pass.
+    '''
+    match = _FILEDATE.search(os.path.basename(ifile))
+    if match is None:
+        return True
+    try:
+        filedate = dt.datetime.strptime(match.group(1),'%Y%m%d')
+    except ValueError:
+        return True
+    if firstday is not None and filedate < dt.datetime(firstday.year,firstday.month,firstday.day)-dt.timedelta(days=1):
+        return False
+    if lastday is not None and filedate >= dt.datetime(lastday.year,lastday.month,lastday.day)+dt.timedelta(days=1):
+        return False
+    return True
+
+
+def read_wdcgg(iday=None,ifiles='unknown',nproc=1,**kwargs):
     '''
-    Read observations downloaded from the World Data Centre for 
+    Read observations downloaded from the World Data Centre for
     Greenhouse Gases (https://gaw.kishou.go.jp/)
+    The files are independent of each other and are read in parallel
+    if nproc is larger than 1.
     '''
     log = logging.getLogger(__name__)
     # read configuration file and get files to read
@@ -37,24 +65,54 @@ def read_wdcgg(iday=None,ifiles='unknown',**kwargs):
     if len(files)==0:
         log.warning('No files found in {}'.format(ifiles))
         return None
-    df = pd.DataFrame()
-    # read all files
-    for ifile in files:
-        idf = _read_single_file(ifile,**kwargs)
-        if idf is not None:
-            df = df.append(idf)
-    df = df.sort_values(by="ISO8601")
+    # skip files whose filename-encoded date is outside the requested window,
+    # which avoids reading them at all
+    firstday = kwargs.get('firstday')
+    lastday = kwargs.get('lastday')
+    if firstday is not None or lastday is not None:
+        nall = len(files)
+        files = [f for f in files if _filename_in_window(f,firstday,lastday)]
+        if len(files) < nall:
+            log.info('Skip {} of {} files based on filename date'.format(nall-len(files),nall))
+    # read all files, memoized by file path and modification time
+    reader = lambda f: _read_single_file_cached(f,os.path.getmtime(f),firstday,lastday)
+    if nproc > 1:
+        with ThreadPoolExecutor(max_workers=nproc) as pool:
+            idfs = list(pool.map(reader,files))
+    else:
+        idfs = [reader(ifile) for ifile in files]
+    parts = [i for i in idfs if i is not None]
+    df = pd.concat(parts,ignore_index=True) if len(parts)>0 else pd.DataFrame()
+    # all files may have been skipped or invalid, in which case there is
+    # nothing to sort
+    if 'ISO8601' in df:
+        df = df.sort_values(by="ISO8601")
+    # store repeated strings as categoricals to save memory. This is done
+    # after the concat across files so that all frames share one dictionary
+    for c in ('original_station_name','obstype','unit'):
+        if c in df:
+            df[c] = df[c].astype('category')
     return df
 
 
+@lru_cache(maxsize=256)
+def _read_single_file_cached(ifile,mtime,firstday,lastday):
+    '''Memoize repeated reads of the same (unmodified) file.'''
+    return _read_single_file(ifile,firstday=firstday,lastday=lastday)
+
+
 def _read_single_file(ifile,firstday=None,lastday=None):
     '''Read a single WDCGG file.'''
     log = logging.getLogger(__name__)
     log.info('Reading {}'.format(ifile))
+    # only read the header lines here - the data block is parsed by read_csv
+    # in _read_data, so there is no need to slurp the whole file into memory
     with open(ifile) as f:
-        lines = f.readlines()
-    nhdr,para,unit,name,lat,lon = _read_header(lines)
-    dates,values = _read_data(lines,nhdr)
+        first = f.readline()
+        nlines = int(_parse_line(first))
+        header = [first] + [f.readline() for _ in range(nlines-1)]
+    nhdr,para,unit,name,lat,lon = _read_header(header)
+    dates,values = _read_data(ifile,header,nhdr)
     # eventually do unit conversion 
     if 'mg/m3' in unit:
         unit = 'ugm-3'
@@ -65,92 +123,91 @@ def _read_single_file(ifile,firstday=None,lastday=None):
     unit = 'ppm' if 'ppm' in unit else unit
     unit = 'ugm-3' if 'g/m3' in unit else unit
     unit = 'ugm-3' if 'gm-3' in unit else unit
-    # construct array
-    nrow = len(dates)
-    idf = pd.DataFrame()
-    idf['ISO8601'] = dates
-    idf['original_station_name'] = [name for i in range(nrow)]
-    idf['lat'] = [lat for i in range(nrow)]
-    idf['lon'] = [lon for i in range(nrow)]
-    idf['obstype'] = [para for i in range(nrow)]
-    idf['unit'] = [unit for i in range(nrow)]
-    idf['value'] = values
-    # Eventually reduce to specified time range
+    # reduce to the specified time range on the raw date array, before the
+    # frame construction below
+    dates = np.asarray(dates)
+    values = np.asarray(values)
     if firstday is not None:
         log.debug('Only use data after {}'.format(firstday))
-        idf = idf.loc[idf['ISO8601'] >= firstday]
+        keep = dates >= np.datetime64(firstday)
+        dates = dates[keep]
+        values = values[keep]
     if lastday is not None:
         log.debug('Only use data before {}'.format(lastday))
-        idf = idf.loc[idf['ISO8601'] < lastday]
+        keep = dates < np.datetime64(lastday)
+        dates = dates[keep]
+        values = values[keep]
+    # construct array in a single construction; scalars broadcast
+    idf = pd.DataFrame({'ISO8601':dates,
+                        'original_station_name':name,
+                        'lat':lat,
+                        'lon':lon,
+                        'obstype':para,
+                        'unit':unit,
+                        'value':values})
     return idf
 
 
+# header tag -> (metadata field, value converter)
+_HEADER_TAGS = {
+    'dataset_parameter':('parameter',str),
+    'site_name':('location_name',str),
+    'site_latitude':('location_lat',float),
+    'site_longitude':('location_lon',float),
+    'value:units':('unit',str),
+}
+
+
 def _read_header(lines):
     '''Read header and parse metadata'''
     log = logging.getLogger(__name__)
-    parameter='unknown'
-    unit='unknown'
-    location_name='unknown'
-    location_lon=np.nan
-    location_lat=np.nan
-    header_lines = np.int(_parse_line(lines[0]))
-    for i,iline in enumerate(lines):
-        if i==header_lines:
-            break
-        if 'dataset_parameter :' in iline:
-            parameter = _parse_line(iline)
-        if 'site_name :' in iline:
-            location_name = _parse_line(iline)
-        if 'site_latitude :' in iline:
-            location_lat = np.float(_parse_line(iline))
-        if 'site_longitude :' in iline:
-            location_lon = np.float(_parse_line(iline))
-        if 'site_longitude :' in iline:
-            location_lon = np.float(_parse_line(iline))
-        if 'value:units :' in iline:
-            unit = _parse_line(iline,elem=2)
-    return header_lines,parameter,unit,location_name,location_lat,location_lon
-
-
-def _read_data(lines,nhdr):
-    '''Read observation data and corresponding dates'''
-    log = logging.getLogger(__name__)
-    hdr = lines[nhdr-1].replace('\n','').replace('# ','').split()
-    cyr = hdr.index('year')
-    cmt = hdr.index('month')
-    cdy = hdr.index('day')
-    chr = hdr.index('hour')
-    cmn = hdr.index('minute')
-    cvl = hdr.index('value')
-    cqc = hdr.index('QCflag')
-    dates = []
-    values = []
-    for iline in lines[nhdr:]:
-        ivals = iline.replace('\n','').split()
-        # Check for quality flag - only accept quality flags 1 and 2
-        qc =  np.int(ivals[cqc])
-        if qc < 1 or qc > 2:
-            continue
-        iyr = np.int(ivals[cyr])
-        if iyr < 1900:
-            continue
-        imt = np.int(ivals[cmt])
-        if imt < 1 or imt > 12:
-            continue
-        idy = np.int(ivals[cdy])
-        if idy < 1 or idy > 32: 
+    meta = {'parameter':'unknown','unit':'unknown','location_name':'unknown',
+            'location_lon':np.nan,'location_lat':np.nan}
+    header_lines = int(_parse_line(lines[0]))
+    for iline in lines[:header_lines]:
+        # the partition splits off the key (which may itself contain a
+        # colon, e.g. 'value:units'), so the value is simply the remainder
+        key,sep,val = iline.partition(' :')
+        if not sep:
             continue
-        ihr = np.int(ivals[chr])
-        if ihr < 0 or ihr > 23: 
+        tag = _HEADER_TAGS.get(key.replace('#','').strip())
+        if tag is None:
             continue
-        imn = np.int(ivals[cmn])
-        imn = np.max((np.min((59,imn)),0)) 
-        idate = dt.datetime(iyr,imt,idy,ihr,imn,0)
-        values.append(np.float(ivals[cvl]))
-        dates.append(idate)
-    i = len(dates)
-    j = len(lines)-nhdr
-    log.info('Read {:d} valid entries from {:d} total entries ({:.2f}%)'.format(i,j,np.float(i)/np.float(j)*100.0))
+        field,conv = tag
+        meta[field] = conv(val.replace('\n','').split(':')[0].replace(' ',''))
+    return header_lines,meta['parameter'],meta['unit'],meta['location_name'],meta['location_lat'],meta['location_lon']
+
+
+def _read_data(ifile,header,nhdr):
+    '''Read observation data and corresponding dates'''
+    log = logging.getLogger(__name__)
+    hdr = header[nhdr-1].replace('\n','').replace('# ','').split()
+    # the files are whitespace-delimited with variable-width columns, which
+    # the pyarrow csv engine does not support - the C engine parser below is
+    # still fully vectorized
+    tb = pd.read_csv(ifile,sep=r'\s+',skiprows=nhdr,header=None,names=hdr,
+                     usecols=['year','month','day','hour','minute','value','QCflag'],
+                     dtype={'year':'int16','month':'int8','day':'int8',
+                            'hour':'int8','minute':'int8','value':'float64','QCflag':'int8'},
+                     memory_map=True)
+    ntot = tb.shape[0]
+    # Check for quality flag - only accept quality flags 1 and 2 - and toss
+    # entries with invalid date fields, all in one vectorized mask. These
+    # bounds checks and the date construction below run as single numpy/
+    # pandas kernels over the parsed arrays, so there is no per-row Python
+    # work left to JIT-compile
+    mask = tb['QCflag'].between(1,2) & (tb['year']>=1900) & tb['month'].between(1,12) \
+           & tb['day'].between(1,32) & tb['hour'].between(0,23)
+    tb = tb.loc[mask].copy()
+    tb['minute'] = tb['minute'].clip(lower=0,upper=59)
+    dates = pd.to_datetime(tb[['year','month','day','hour','minute']],errors='coerce')
+    valid = dates.notna().values
+    dates = dates.loc[valid]
+    values = tb['value'].to_numpy()[valid]
+    i = len(values)
+    j = ntot
+    pct = 100.0*float(i)/float(j) if j>0 else 0.0
+    log.info('Read {:d} valid entries from {:d} total entries ({:.2f}%)'.format(i,j,pct))
     return dates,values
 
 
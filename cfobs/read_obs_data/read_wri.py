@@ -25,7 +25,21 @@ import pandas as pd
 import yaml
 
 from ..units import conv_ugm3_to_ppbv_std
-from ..systools import load_config 
+from ..systools import load_config
+
+# polars offers a multithreaded csv reader and join - use it if requested
+# and available
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# use the C yaml dumper if available - it is several times faster than the
+# pure-Python dumper
+try:
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    _YamlDumper = yaml.SafeDumper
 
 
 def read_wri(iday=None,data=[],sites=[],locfile=None,**kwargs):
@@ -36,7 +50,7 @@ def read_wri(iday=None,data=[],sites=[],locfile=None,**kwargs):
     '''
     log = logging.getLogger(__name__)
     # output array
-    dat = pd.DataFrame()
+    frames = []
     # do for every entry
     data = [data] if type(data) == type('') else data
     sites = [sites] if type(sites) == type('') else sites
@@ -46,36 +60,55 @@ def read_wri(iday=None,data=[],sites=[],locfile=None,**kwargs):
             locations = load_config(locfile)
     for d,s in zip(data,sites):
         idat, ilocs = _read_file ( d, s, **kwargs )
-        dat = dat.append(idat)
+        if idat is not None:
+            frames.append(idat)
         locations.update(ilocs)
-    # eventually write out locations to yaml file
+    # eventually write out locations to yaml file. This is done once after
+    # the loop - serializing the full dict per input file was redundant
+    if locfile is not None:
         with open(locfile, 'w') as ofile:
-            yaml.dump(locations, ofile)
+            yaml.dump(locations, ofile, Dumper=_YamlDumper)
         log.info('locations written to {}'.format(locfile))
+    dat = pd.concat(frames,ignore_index=True) if len(frames)>0 else pd.DataFrame()
     return dat
 
 
-def _read_file(data,site,firstday=None,lastday=None,skipnan=True,remove_negatives=True,fmt="%m/%d/%Y %H:%M"):
+def _read_file(data,site,firstday=None,lastday=None,skipnan=True,remove_negatives=True,fmt="%m/%d/%Y %H:%M",backend='pandas'):
     '''Read individual file.'''
     log = logging.getLogger(__name__)
-    # parse site information 
+    if backend=='polars' and pl is None:
+        log.warning('polars not available - falling back to pandas backend')
+        backend = 'pandas'
+    # parse site information
     if not os.path.exists(site):
         log.warning('site file not found: {}'.format(site))
         return None
     log.info('Reading {}'.format(site))
-    st = pd.read_csv(site,encoding="ISO-8859-1")
+    if backend=='polars':
+        st = pl.read_csv(site,encoding='utf8-lossy').to_pandas()
+    else:
+        st = pd.read_csv(site,encoding="ISO-8859-1")
     st = st.rename(columns={'Latitude':'lat','Longitude':'lon'})
-    st['original_station_name'] = ['_'.join(('WRI',i,j,k)).replace(' ','_').replace('-','').replace('.','') for i,j,k in zip(st['City'],st['SiteName'],st['SiteID'])]
-    # read data 
+    # build the station names with vectorized string kernels; spaces become
+    # underscores and dashes/dots are dropped, as before
+    names = 'WRI_'+st['City'].astype(str)+'_'+st['SiteName'].astype(str)+'_'+st['SiteID'].astype(str)
+    st['original_station_name'] = names.str.replace(' ','_',regex=False).str.replace(r'[.\-]','',regex=True)
+    # read data
     if not os.path.exists(data):
         log.warning('data file not found: {}'.format(data))
         return None
     log.info('Reading {}'.format(data))
-    df = pd.read_csv(data,encoding="ISO-8859-1")
-    df = df.merge(st[['SiteID','lat','lon','original_station_name']],on='SiteID')
-    # read dates 
-    df['ISO8601'] = [dt.datetime.strptime(i,fmt) for i in df['UTCDatetime']]
-    df['localtime'] = [dt.datetime.strptime(i,fmt) for i in df['LocalDatetime']]
+    if backend=='polars':
+        # multithreaded read and join, handed back to pandas at the boundary
+        df = pl.read_csv(data,encoding='utf8-lossy').join(
+             pl.from_pandas(st[['SiteID','lat','lon','original_station_name']]),on='SiteID').to_pandas()
+    else:
+        df = pd.read_csv(data,encoding="ISO-8859-1")
+        df = df.merge(st[['SiteID','lat','lon','original_station_name']],on='SiteID')
+    # read dates. The format is fixed, so one vectorized parse with caching
+    # replaces the per-row strptime
+    df['ISO8601'] = pd.to_datetime(df['UTCDatetime'],format=fmt,cache=True)
+    df['localtime'] = pd.to_datetime(df['LocalDatetime'],format=fmt,cache=True)
     # accumulate by species
     idfs = []
     for k in df.keys():
@@ -85,24 +118,24 @@ def _read_file(data,site,firstday=None,lastday=None,skipnan=True,remove_negative
             continue 
         k = k[0]
         obstype = k.split('(')[0].lower().replace('.','')
-        df[k] = [str(i).strip() for i in df[k]]
-        df.loc[df[k]=='',k] = 'nan'
-        df[k] = [np.float(i) for i in df[k]]
-        idf = df.loc[~np.isnan(df[k])].copy()
+        # parse the values in one vectorized pass; empty or invalid entries
+        # become NaN
+        df[k] = pd.to_numeric(df[k].astype(str).str.strip(),errors='coerce')
+        idf = df.loc[~np.isnan(df[k])]
         if idf.shape[0]==0:
             continue
         ldat = idf[['ISO8601','localtime','original_station_name','lat','lon']].copy()
         unit = _get_unit(k)
-        ldat['obstype'] = [obstype for i in range(ldat.shape[0])]
+        ldat['obstype'] = obstype
         ldat['value'] = idf[k]
         # convert standard atmospheric O3 and NO2 to ppbv
         if obstype in ['o3','no2'] and 'g/sm3' in unit:
             mw = 48.0 if obstype=='o3' else 46.0
             conv = conv_ugm3_to_ppbv_std(mw)
-            ldat['value'] = [i*conv for i in ldat['value'].values]
+            ldat['value'] = ldat['value'].values*conv
             unit = 'ppbv'
             log.info('Converted standard atmosphere {} ug/m3 to ppbv using factor of {:.3f}'.format(obstype,conv))
-        ldat['unit'] = [unit for i in range(ldat.shape[0])]
+        ldat['unit'] = unit
         idfs.append(ldat) 
     # merge individual data sets
     if len(idfs) > 0:
@@ -111,20 +144,21 @@ def _read_file(data,site,firstday=None,lastday=None,skipnan=True,remove_negative
         idat = None 
         log.warning('No valid data found!')
     if idat is not None:
+        # combine the day filters into one mask and a single row selection
+        mask = np.ones(idat.shape[0],dtype=bool)
         if firstday is not None:
             log.info('Only use data after {}'.format(firstday))
-            idat = idat.loc[idat['ISO8601'] >= firstday].copy()
+            mask &= (idat['ISO8601'] >= firstday).values
         if lastday is not None:
             log.info('Only use data before {}'.format(lastday))
-            idat = idat.loc[idat['ISO8601'] < lastday].copy()
+            mask &= (idat['ISO8601'] < lastday).values
+        if not mask.all():
+            idat = idat.loc[mask]
         idat = idat.sort_values(by='ISO8601')
-        # locations info
-        locations = {}
-        locs = idat.groupby('original_station_name').mean().reset_index()
-        for l in locs.original_station_name.unique():
-            ilat = locs.loc[locs.original_station_name==l].lat.values[0]
-            ilon = locs.loc[locs.original_station_name==l].lon.values[0]
-            locations[l] = {'lat':'{:.4f}'.format(ilat),'lon':'{:.4f}'.format(ilon)}
+        # locations info: one grouped pass over the coordinates, then a
+        # single linear traversal of the (already unique) station rows
+        locs = idat.groupby('original_station_name')[['lat','lon']].mean().reset_index()
+        locations = {t.original_station_name:{'lat':'{:.4f}'.format(t.lat),'lon':'{:.4f}'.format(t.lon)} for t in locs.itertuples(index=False)}
     return idat, locations
 
 
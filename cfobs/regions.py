@@ -11,9 +11,12 @@
 import os
 import yaml
 import numpy as np
+import pandas as pd
 import logging
 import requests
 
+from .systools import load_config
+
 
 def define_regions(regionsfile):
     '''
@@ -24,8 +27,8 @@ def define_regions(regionsfile):
     if not os.path.isfile(regionsfile):
         log.error('Region configuration file does not exist: {}'.format(regionsfile),exc_info=True)
         return None
-    with open(regionsfile,'r') as f:
-        regions = yaml.load(f, Loader=yaml.FullLoader)
+    # load_config caches parsed files, so repeated calls do not reparse
+    regions = load_config(regionsfile)
     return regions
 
 
@@ -35,19 +38,29 @@ def set_regions(df,regions=None,regionsfile=""):
     The regions information can be passed as a dictionary object.
     If not specified, it is read from a YAML file.
     '''
-    df['regionID'] = np.zeros((df.shape[0]),).astype(int)
-    df['region'] = ['unknown' for i in range(df.shape[0])]
-    df['regionShortName'] = ['unknown' for i in range(df.shape[0])]
     if regions is None:
         regions = define_regions(regionsfile)
     assert(regions is not None), 'Error getting regions definition'
-    for r in regions:
-        idx = df.index[(df['lat']>=regions[r]['minlat'])&(df['lat']<regions[r]['maxlat'])&(df['lon']>=regions[r]['minlon'])&(df['lon']<regions[r]['maxlon'])]
-        if len(idx)>0:
-            df.loc[idx,'regionID'] = regions[r]['regionID']
-            df.loc[idx,'region']   = r
-            if 'region_shortname' in regions[r]:
-                df.loc[idx,'regionShortName'] = regions[r].get('region_shortname')
+    # assign all regions in a single broadcasted pass instead of one full
+    # DataFrame scan and write per region
+    rnames = list(regions)
+    bounds = np.array([[regions[r]['minlat'],regions[r]['maxlat'],regions[r]['minlon'],regions[r]['maxlon']] for r in rnames])
+    rids = np.array([regions[r]['regionID'] for r in rnames])
+    shortnames = np.array([regions[r].get('region_shortname','unknown') for r in rnames],dtype=object)
+    lat = df['lat'].values[:,None]
+    lon = df['lon'].values[:,None]
+    mask = (lat>=bounds[:,0]) & (lat<bounds[:,1]) & (lon>=bounds[:,2]) & (lon<bounds[:,3])
+    hit = mask.any(axis=1)
+    # pick the last matching region, which matches the override behavior of
+    # the previous per-region loop
+    pick = mask.shape[1]-1-mask[:,::-1].argmax(axis=1)
+    df['regionID'] = np.where(hit,rids[pick],0)
+    # store the names as categoricals built straight from the pick codes -
+    # one byte per row instead of a python string reference, and groupby
+    # operates on the integer codes
+    codes = np.where(hit,pick,len(rnames))
+    df['region'] = pd.Categorical.from_codes(codes,categories=rnames+['unknown'])
+    df['regionShortName'] = pd.Categorical(np.where(hit,shortnames[pick],'unknown'))
     return df
 
 
@@ -27,8 +27,9 @@ def set_season(df):
     3 = JJA
     4 = SON
     '''
-    # write out season for each entry
-    df['season'] = [(i.month%12+3)//3 for i in df['ISO8601']]
+    # write out season for each entry in one vectorized pass
+    months = pd.to_datetime(df['ISO8601']).dt.month
+    df['season'] = (months % 12 + 3) // 3
     return df
 
 
@@ -39,5 +40,5 @@ def get_season_name(i):
 def reduce_data_to_season(df,season_number):
     '''Reduce the data frame to the season provided in the input argument.'''
     if 'season' not in df.keys():
-        df = df.set_season(df)
+        df = set_season(df)
     return df.loc[df['season']==season_number].copy()
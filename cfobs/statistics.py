@@ -34,39 +34,38 @@ def compute_metrics_by_location(idat,season_number=-1,modcol='conc_mod',
 
     log = logging.getLogger(__name__)
     log.info('Compute metrics...')
-    # Make local copy of input array, since we will be messing around with it.
-    # Subsamble to data for selected season if applicable. 
+    # Subsample to data for selected season if applicable.
     if season_number <= 0:
-        dat = idat.copy()
+        dat = idat
     else:
         dat = reduce_data_to_season(idat,season_number)
-    # Compute some metrics on the full data array
-    dat = compute_unaggregated_metrics(dat,modcol,obscol)
-    dat['bias2'] = dat['bias']**2
-    # Aggregate data by location (mean and sum)
-    # df is going to be the output array
+    # Compute some metrics on the full data array. assign builds the new
+    # columns on a fresh frame in one step, so the caller's array is left
+    # alone without an explicit full copy
+    bias = dat[modcol].values - dat[obscol].values
+    dat = dat.assign(bias=bias,AbsErr=np.abs(bias),bias2=bias**2)
+    # Aggregate data by location. The column means (df, the output array) and
+    # the sums/counts needed below share one groupby hash
     group = dat.groupby(loccol)
-    df     = group.mean()
-    df_sum = group.sum().reset_index()
+    df  = group.mean(numeric_only=True)
+    agg = group.agg(bias_sum=('bias','sum'),obs_sum=(obscol,'sum'),
+                    abserr_sum=('AbsErr','sum'),nobs=(obscol,'count'))
     # Toss locations that do not have enough observations, if a minimum
-    # number of observations is specified. 
-    if minnobs is not None:
-        df_count = group.count()
-        idx = df_count.index[df_count[obscol]>=minnobs]
+    # number of observations is specified. A threshold of one (or none)
+    # cannot filter anything, so skip the pass entirely in that case
+    if minnobs is not None and minnobs > 1:
+        idx = agg.index[agg['nobs']>=minnobs]
         df = df.loc[idx]
+        agg = agg.loc[idx]
     # Get RMSE and NMB
     df['RMSE'] = df['bias2']**0.5
-    df['NMB'] = df_sum['bias'] / df_sum[obscol]
-    # Compute Index of Agreement and Pearson correlation coefficient 
-    # For this we first need to add the means (by location) and compute 
-    # some additional statistics to the non-aggregated array
-    # means are the mean observation and model value per location
-    means = pd.DataFrame()
-    means[loccol]     = df.index
-    means['obsmean']  = df[obscol].values
-    means['modmean']  = df[modcol].values
-    # add these values to dat and compute metrics needed for IOA and R2
-    dat = dat.merge(means,on=loccol)
+    df['NMB'] = agg['bias_sum'] / agg['obs_sum']
+    # Compute Index of Agreement and Pearson correlation coefficient
+    # For this we first broadcast the means (by location) back onto the
+    # non-aggregated array via an index join, compute the cross terms as
+    # vectorized column ops, and reduce them in a single second grouped pass
+    means = df[[obscol,modcol]].rename(columns={obscol:'obsmean',modcol:'modmean'})
+    dat = dat.join(means,on=loccol)
     dat['mod-modmean']  = dat[modcol].values - dat['modmean'].values
     dat['mod-variance'] = dat['mod-modmean'].values**2
     dat['mod-obsmean']  = dat[modcol].values - dat['obsmean'].values
@@ -74,18 +73,11 @@ def compute_metrics_by_location(idat,season_number=-1,modcol='conc_mod',
     dat['obs-variance'] = dat['obs-obsmean'].values**2
     dat['diffproduct']  = dat['mod-modmean'].values * dat['obs-obsmean'].values
     dat['abserrsum']    = np.abs(dat['mod-obsmean'].values)+np.abs(dat['obs-obsmean'].values)
-    dat_sum = dat.groupby(loccol).sum().reset_index()
-    # Calculate IOA in a new data frame, then merge with the output frame
-    ioadat = dat_sum[[loccol,'abserrsum']].copy()
-    ioadat = ioadat.merge(df_sum[[loccol,'AbsErr']],on=loccol)
-    ioadat['IOA'] = 1.0 - ( ioadat['AbsErr'].values / ioadat['abserrsum'].values )
-    df = df.merge(ioadat[[loccol,'IOA']],on=loccol)
-    del(ioadat)
-    # Calculate R2 in a new data frame, then merge with the output frame
-    r2dat = dat_sum[[loccol,'diffproduct','mod-variance','obs-variance']].copy()
-    r2dat['vars'] = np.sqrt(r2dat['mod-variance'].values) * np.sqrt(r2dat['obs-variance'].values)
-    r2dat['R2'] = ( r2dat['diffproduct'] / r2dat['vars'] )**2
-    df = df.merge(r2dat[[loccol,'R2']],on=loccol)
-    del(r2dat)
+    dat_sum = dat.groupby(loccol)[['mod-variance','obs-variance','diffproduct','abserrsum']].sum()
+    # Calculate IOA and R2; all frames share the location index, so these
+    # assignments align without any merges
+    df['IOA'] = 1.0 - ( agg['abserr_sum'] / dat_sum['abserrsum'] )
+    variances = np.sqrt(dat_sum['mod-variance']) * np.sqrt(dat_sum['obs-variance'])
+    df['R2'] = ( dat_sum['diffproduct'] / variances )**2
     # All done
     return df
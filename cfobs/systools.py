@@ -13,6 +13,16 @@ import yaml
 
 from .parse_string import parse_date
 
+# use the C yaml loader if available - it is several times faster than the
+# pure-Python loader
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    _YamlLoader = yaml.FullLoader
+
+# cache of parsed configuration files, keyed by path and modification time
+_CFG_CACHE = {}
+
 
 def check_dir(full_file_name,idate):
     '''Check if directory exists, creates it if needed'''
@@ -25,9 +35,12 @@ def check_dir(full_file_name,idate):
 
 def load_config(config_file):
     '''
-    Load a yaml configuration file.
+    Load a yaml configuration file. Parsed files are cached by path and
+    modification time, so repeated loads of an unchanged file are free.
     '''
     assert os.path.isfile(config_file), 'Error - file not found: {}'.format(config_file)
-    with open(config_file,'r') as f:
-        config = yaml.load(f, Loader=yaml.FullLoader)
-    return config
+    key = (config_file,os.path.getmtime(config_file))
+    if key not in _CFG_CACHE:
+        with open(config_file,'r') as f:
+            _CFG_CACHE[key] = yaml.load(f, Loader=_YamlLoader)
+    return _CFG_CACHE[key]
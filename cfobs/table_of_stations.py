@@ -18,16 +18,26 @@ import yaml
 
 def read_table_of_stations(stationsfile,obskey=""):
     '''
-    Read a previously saved stations table. 
+    Read a previously saved stations table. Prefers the binary parquet
+    sidecar written by write_table_of_stations (if it is at least as new
+    as the csv file), which avoids reparsing the csv on every startup.
     '''
     ifile = stationsfile.replace('%t',obskey)
-    if os.path.isfile(ifile):
+    pfile = _parquet_sidecar(ifile)
+    if os.path.isfile(pfile) and (not os.path.isfile(ifile) or os.path.getmtime(pfile)>=os.path.getmtime(ifile)):
+        stationstable = pd.read_parquet(pfile)
+    elif os.path.isfile(ifile):
         stationstable = pd.read_csv(ifile)
     else:
         stationstable = pd.DataFrame()
     return stationstable
 
 
+def _parquet_sidecar(ifile):
+    '''Name of the parquet file written alongside the stations csv file.'''
+    return os.path.splitext(ifile)[0]+'.parquet'
+
+
 def update_stations_info(df,st,lats,lons,location_name_prefix=None):
     '''
     Update the stations information in both the observation data frame and the stations list.
@@ -59,29 +69,29 @@ def update_stations_info(df,st,lats,lons,location_name_prefix=None):
     # create a new entry that contains the lat/lon in one float.
     df['lat']       = df['lat'].values.round(4)
     df['lon']       = df['lon'].values.round(4)
-    df['latlon_id'] = [(i+90.0)*1.0e7+(j+180.0) for i,j in zip(df['lat'].values,df['lon'].values)]
+    df['latlon_id'] = (df['lat'].values+90.0)*1.0e7 + (df['lon'].values+180.0)
     # Get missing stations
-    df = df.set_index('latlon_id')
-    st = st.set_index('latlon_id')
-    missing = df.index.difference(st.index) 
-    st = st.reset_index()
-    df = df.reset_index()
+    missing = np.setdiff1d(df['latlon_id'].unique(),st['latlon_id'].values)
     # Prefix used for station names
     station_prefix = location_name_prefix+"_Station_" if location_name_prefix is not None else "Station_"
     if len(missing) > 0:
         idf = df.loc[df['latlon_id'].isin(missing),['original_station_name','lat','lon','latlon_id']].groupby(['latlon_id']).min().reset_index()
-        # Add unique station name. this is simply 'StationXX' where XX is a unique number
-        idf['location'] = [station_prefix+str(i+nstat).zfill(7) for i in range(idf.shape[0])]
+        # Add unique station name. this is simply 'StationXX' where XX is a
+        # unique number. The labels are built with C-level string kernels
+        # instead of per-row Python formatting
+        idf['location'] = np.char.add(station_prefix,np.char.zfill(np.arange(nstat,nstat+idf.shape[0]).astype(str),7))
         # Grid data onto grid and assign station name to it.
         if lats is not None and lons is not None:
-            idf['lon_gridded']       = [lons[np.abs(lons-i).argmin()] for i in idf.lon.values] 
-            idf['lat_gridded']       = [lats[np.abs(lats-i).argmin()] for i in idf.lat.values]
-            idf['location_gridded']  = ['Station_{0:07.2f}E_{1:06.2f}N'.format(i,j) for i,j in zip(idf['lon_gridded'].values,idf['lat_gridded'].values)]
+            idf['lon_gridded']       = np.asarray(lons)[nearest_grid_index(lons,idf.lon.values)]
+            idf['lat_gridded']       = np.asarray(lats)[nearest_grid_index(lats,idf.lat.values)]
+            loc_gridded              = np.char.add('Station_',np.char.mod('%07.2f',idf['lon_gridded'].values))
+            loc_gridded              = np.char.add(loc_gridded,np.char.mod('E_%06.2f',idf['lat_gridded'].values))
+            idf['location_gridded']  = np.char.add(loc_gridded,'N')
         else:
-            idf['lon_gridded']       = np.zeros((len(missing),))*np.nan
-            idf['lat_gridded']       = np.zeros((len(missing),))*np.nan
-            idf['location_gridded']  = ['unknown' for i in range(len(missing))]
-        idf['latlon_id_gridded'] = [(i+90.0)*1.0e7+(j+180.0) for i,j in zip(idf['lat_gridded'].values,idf['lon_gridded'].values)]
+            idf['lon_gridded']       = np.nan
+            idf['lat_gridded']       = np.nan
+            idf['location_gridded']  = 'unknown'
+        idf['latlon_id_gridded'] = (idf['lat_gridded'].values+90.0)*1.0e7 + (idf['lon_gridded'].values+180.0)
         # Add to stations file
         st = pd.concat([st,idf],sort=True)
         # Eventually remove dummy station
@@ -101,9 +111,31 @@ def write_table_of_stations(stationstable,stationsfile,obskey=""):
     ofile = stationsfile.replace('%t',obskey)
     stationstable = stationstable[['location','lat','lon','latlon_id','original_station_name','location_gridded','lat_gridded','lon_gridded','latlon_id_gridded']]
     stationstable.to_csv(ofile,index=False,header=True,float_format='%.4f')
+    # also write a parquet sidecar, which read_table_of_stations prefers
+    # over reparsing the csv file
+    try:
+        stationstable.to_parquet(_parquet_sidecar(ofile),index=False)
+    except ImportError:
+        pass
     return
 
 
+def nearest_grid_index(grid,values):
+    '''
+    Returns the indices of the grid points nearest to the given values.
+    The grid axis must be sorted, which allows a single searchsorted call
+    instead of a full distance scan per value.
+    '''
+    grid = np.asarray(grid)
+    values = np.asarray(values)
+    idx = np.clip(np.searchsorted(grid,values),1,grid.shape[0]-1)
+    left = grid[idx-1]
+    right = grid[idx]
+    # ties at the exact midpoint go to the lower index, like argmin would
+    idx -= ((values-left) <= (right-values)).astype(int)
+    return idx
+
+
 def get_lat_lon_of_regular_grid(gridres=1.0):
     '''
     Returns the latitudes and longitudes on the gridfile.
@@ -11,6 +11,8 @@
 import numpy as np
 import pandas as pd
 
+from .table_of_stations import nearest_grid_index
+
 # constants
 RCONST  = 8.3145 # gas constant, J K−1 mol−1 
 PPM2PPB = 1.0e+3 # conversion factor from ppmv to ppbv, unitless
@@ -67,8 +69,8 @@ def to_ppbv(df,conv_ugm3_to_ppbv=None,convscal=1.0,temp=None,press=None,mw=1.0,
             conv_ugm3_to_ppbv = get_conv_ugm3_to_ppbv(temperature,pressure,mw)
         lons = conv_ugm3_to_ppbv.lon.values
         lats = conv_ugm3_to_ppbv.lat.values
-        lonidx = [np.abs(lons-i).argmin() for i in df.loc[iidx,loncol].values]
-        latidx = [np.abs(lats-i).argmin() for i in df.loc[iidx,latcol].values]
+        lonidx = nearest_grid_index(lons,df.loc[iidx,loncol].values)
+        latidx = nearest_grid_index(lats,df.loc[iidx,latcol].values)
         df.loc[iidx,colname] = df.loc[iidx,colname]*conv_ugm3_to_ppbv.values[latidx,lonidx]*convscal
 
 #---ppmv to ppbv 
@@ -16,11 +16,16 @@ import numpy as np
 import datetime as dt
 import os
 import pandas as pd
+import logging
+import multiprocessing as mp
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 # import CFtools
 sys.path.insert(1,'../')
-import cfobs.cfobs as cfobs 
+import cfobs.cfobs as cfobs
 import cfobs.systools as systools
+from cfobs.parse_string import parse_date, parse_vars, parse_key
 
 # settings
 openaq_json   = 'data/openaq.%Y-%m-%d.ndjson'
@@ -30,33 +35,92 @@ ofile_png     = 'out/figures/openaq_%Y%m%d_!k_!v.png'
 configfile    = 'config/mapping_openaq.yaml'
 regionsfile   = 'config/regions.yaml'
 
+# per-species plot specifications, assembled once at module level as frozen
+# named tuples. The constants shared by every spec (output file, map source,
+# regions file) are attached in get_mapplotspecs / get_boxplotspecs
+MapPlotSpec = namedtuple('MapPlotSpec',['obstype','modvar','mapvar','mapvarscal','maxbias','minval','maxval','maplabel','statistic','title'])
+BoxPlotSpec = namedtuple('BoxPlotSpec',['obstype','minval','maxval','title','ylabel','modcol','modvar'])
+
+MAP_SPECS = {
+    'o3'         : MapPlotSpec('o3'  ,'o3'         ,'o3'             ,1.0e9,50.0,0.0,80.0,'Surface O$_{3}$ [ppbv]'        ,'IOA','Ozone (%Y-%m-%d)'),
+    'no2'        : MapPlotSpec('no2' ,'no2'        ,'no2'            ,1.0e9,25.0,0.0,75.0,'Surface NO$_{2}$ [ppbv]'       ,'IOA','Nitrogen dioxide (%Y-%m-%d)'),
+    'pm25_gcc'   : MapPlotSpec('pm25','pm25_gcc'   ,'pm25_rh35_gcc'  ,1.0  ,50.0,0.0,80.0,'Surface PM2.5 [$\mu$gm$^{-3}$]','IOA','PM2.5 from GEOS-Chem (%Y-%m-%d)'),
+    'pm25_gocart': MapPlotSpec('pm25','pm25_gocart','pm25_rh35_gocar',1.0e9,50.0,0.0,80.0,'Surface PM2.5 [$\mu$gm$^{-3}$]','IOA','PM2.5 from GOCART (%Y-%m-%d)'),
+    }
+
+BOX_SPECS = {
+    'o3'         : BoxPlotSpec('o3'  ,-50.0 ,50.0 ,'Ozone (%Y-%m-%d)'               ,'Surface O$_{3}$ bias [ppbv]'        ,'conc_mod'       ,None),
+    'no2'        : BoxPlotSpec('no2' ,-50.0 ,50.0 ,'Nitrogen dioxide (%Y-%m-%d)'    ,'Surface NO$_{2}$ bias [ppbv]'       ,'conc_mod'       ,None),
+    'pm25_gcc'   : BoxPlotSpec('pm25',-100.0,100.0,'PM2.5 from GEOS-Chem (%Y-%m-%d)','Surface PM2.5 bias [$\mu$gm$^{-3}$]','conc_mod'       ,'pm25_rh35_gcc'),
+    'pm25_gocart': BoxPlotSpec('pm25',-100.0,100.0,'PM2.5 from GOCART (%Y-%m-%d)'   ,'Surface PM2.5 bias [$\mu$gm$^{-3}$]','conc_mod_gocart','pm25_rh35_gocar'),
+    }
+
+
 def get_mapplotspecs(args):
     '''Specify map plot specifications for all species'''
-    mapplotspecs = {}
-    mapplotspecs['o3'] = set_mapplotspecs('o3','o3','o3',1.0e9,50.0,0.0,80.0,'Surface O$_{3}$ [ppbv]','IOA','Ozone (%Y-%m-%d)')
-    mapplotspecs['no2'] = set_mapplotspecs('no2','no2','no2',1.0e9,25.0,0.0,75.0,'Surface NO$_{2}$ [ppbv]','IOA','Nitrogen dioxide (%Y-%m-%d)')
-    mapplotspecs['pm25_gcc'] = set_mapplotspecs('pm25','pm25_gcc','pm25_rh35_gcc',1.0,50.0,0.0,80.0,'Surface PM2.5 [$\mu$gm$^{-3}$]','IOA','PM2.5 from GEOS-Chem (%Y-%m-%d)')
-    mapplotspecs['pm25_gocart'] = set_mapplotspecs('pm25','pm25_gocart','pm25_rh35_gocar',1.0e9,50.0,0.0,80.0,'Surface PM2.5 [$\mu$gm$^{-3}$]','IOA','PM2.5 from GOCART (%Y-%m-%d)')
-    return mapplotspecs
-
-def set_mapplotspecs(obstype,modvar,mapvar,mapvarscal,maxbias,minval,maxval,maplabel,stat,title,modcol='conc_mod',ofile=ofile_png,mapfiles=mapfiles,dotedgecolor='grey',dotsize=10):
-    '''Define map plot settings for a species.'''
-    idict = {'obstype':obstype,'modvar':modvar,'mapvar':mapvar,'mapvarscal':modvarscal,'maxbias':maxbias,'minval':minval,'maxval':maxval,'maplabel':maplabel,'statistic':stat,'title':title,'modcol':modcol,'ofile':ofile,'mapfiles':mapfiles}
-    return idict 
+    return {k:dict(spec._asdict(),modcol='conc_mod',ofile=ofile_png,mapfiles=mapfiles,renderer='pcolormesh',shading='auto')
+            for k,spec in MAP_SPECS.items()}
 
 def get_boxplotspecs(args):
     '''Specify boxplot specifications'''
-    boxplotspecs = {}
-    boxplotspecs['o3'] = set_boxplotspecs('o3',-50.0,50.0,'Ozone (%Y-%m-%d)','Surface O$_{3}$ bias [ppbv]')
-    boxplotspecs['no2'] = set_boxplotspecs('no2',-50.0,50.0,'Nitrogen dioxide (%Y-%m-%d)','Surface NO$_{2}$ bias [ppbv]')
-    boxplotspecs['pm25_gcc'] = set_boxplotspecs('pm25',-100.0,100.0,'PM2.5 from GEOS-Chem (%Y-%m-%d)','Surface PM2.5 bias [$\mu$gm$^{-3}$]',modvar='pm25_rh35_gcc')
-    boxplotspecs['pm25_gocart'] = set_boxplotspecs('pm25',-100.0,100.0,'PM2.5 from GOCART (%Y-%m-%d)','Surface PM2.5 bias [$\mu$gm$^{-3}$]',modcol='conc_mod_gocart',modvar='pm25_rh35_gocar')
-    return boxplotspecs
+    return {k:dict(spec._asdict(),plot_by_season=0,plot_by_region=1,regionsfile=regionsfile,statistic='bias',aggregate_by_location=0,ofile=ofile_png)
+            for k,spec in BOX_SPECS.items()}
+
 
-def set_boxplotspecs(obstype,minval,maxval,title,ylabel,plot_by_season=0,plot_by_region=1,regionsfile=regionsfile,stat='bias',modcol='conc_mod',aggregate_by_location=0,ofile=ofile_png,modvar=None):
-    '''Define boxplot settings for a species'''
-    idict = {'obstype':obstype,'minval':minval,'maxval':maxval,'title':title,'ylabel':ylabel,'plot_by_season':plot_by_season,'plot_by_region':plot_by_region,'regionsfile':regionsfile,'statistic':stat,'modcol':modcol,'aggregate_by_location':aggregate_by_location,'ofile':ofile,'modvar':modvar}
-    return idict
+def _figure_uptodate(spec,plotkey,iday,inputs):
+    '''
+    Check whether the target figure already exists and is newer than all of
+    its inputs, in which case rendering it again would reproduce the same
+    file. Resolves the file name the same way the plot layer does.
+    '''
+    modvar = spec.get('modvar') or spec['obstype']
+    target = parse_date(parse_vars(parse_key(spec.get('ofile',ofile_png),plotkey),spec['obstype'],modvar),iday)
+    if not os.path.isfile(target) or len(inputs)==0:
+        return False
+    return os.path.getmtime(target) >= max(os.path.getmtime(i) for i in inputs)
+
+
+def _prune_uptodate(specs,plotkey,iday):
+    '''Drop all plot specs whose figure is already up-to-date.'''
+    log = logging.getLogger(__name__)
+    inputs = [i for i in (parse_date(openaq_json,iday),configfile,regionsfile) if os.path.isfile(i)]
+    pruned = {}
+    for ispec,spec in specs.items():
+        if _figure_uptodate(spec,plotkey,iday,inputs):
+            log.info('{} figure for {} is up-to-date - skip (use --force to rerender)'.format(plotkey,ispec))
+        else:
+            pruned[ispec] = spec
+    return pruned
+
+
+# cfobs object shared with forked plot workers (set by _render_plots)
+_plot_cfob = None
+
+def _render_plot(task):
+    '''Render a single plot in a (possibly forked) worker.'''
+    plotkey,spec = task
+    _plot_cfob.plot( plotkey=plotkey, **spec )
+
+def _render_plots(cfob,plotkey,specs,nproc=1):
+    '''
+    Render the plots for all species. The plots are independent of each
+    other, so with nproc>1 they are farmed out to a process pool. The
+    workers are forked so they inherit the data frame without any
+    serialization.
+    '''
+    global _plot_cfob
+    _plot_cfob = cfob
+    tasks = [(plotkey,specs[ispec]) for ispec in specs]
+    if len(tasks)==0:
+        return
+    if nproc > 1 and 'fork' in mp.get_all_start_methods():
+        ctx = mp.get_context('fork')
+        with ProcessPoolExecutor(max_workers=min(nproc,len(tasks)),mp_context=ctx) as pool:
+            list(pool.map(_render_plot,tasks))
+    else:
+        for task in tasks:
+            _render_plot(task)
+    return
 
 
 def main(args):
@@ -76,35 +140,44 @@ def main(args):
     # Add regions information
     cfob.update_regions( regionsfile=regionsfile )
 
-    # Save to file
+    # Save to file. Parquet stores the floats in compressed binary columns,
+    # which is much faster to write and to reload than the csv text format
     if args.save_csv==1:
         systools.check_dir(ofile_csv,iday)
-        cfob.save( ofile=ofile_csv, append=False, nfloats=4 )
+        if args.format=='parquet':
+            ofile_parquet = iday.strftime(ofile_csv).replace('.csv','.parquet')
+            cfob._data.to_parquet(ofile_parquet,engine='pyarrow',compression='zstd')
+        else:
+            cfob.save( ofile=ofile_csv, append=False, nfloats=4 )
 
     # Make plots
     if args.plot == 1:
         systools.check_dir(ofile_png,iday)
-        # Map plot
+        # Map plot. Figures that are newer than all of their inputs are
+        # skipped unless --force is set
         if args.mapplot==1:
-            mapplotspecs = get_mapplotspecs(args)
-            for ispec in mapplotspecs:
-                cfob.plot( plotkey='map',
-                           **mapplotspecs[ispec])
-        # Boxplot 
+            specs = get_mapplotspecs(args)
+            if args.force==0:
+                specs = _prune_uptodate(specs,'map',iday)
+            _render_plots(cfob,'map',specs,args.nproc)
+        # Boxplot
         if args.boxplot==1:
-             boxplotspecs = get_boxplotspecs(args)
-             for ispec in boxplotspecs:
-                 cfob.plot( plotkey='boxplot',
-                            **boxplotspecs[ispec])
+            specs = get_boxplotspecs(args)
+            if args.force==0:
+                specs = _prune_uptodate(specs,'boxplot',iday)
+            _render_plots(cfob,'boxplot',specs,args.nproc)
     return
     
 
 def parse_args():
     p = argparse.ArgumentParser(description='Undef certain variables')
     p.add_argument('-s','--save-csv',type=int,help='save data to file for faster reloading lateron',default=0)
+    p.add_argument('-f','--format',type=str,choices=('csv','parquet'),help='output format for the saved data',default='csv')
     p.add_argument('-p','--plot',type=int,help='make plot',default=1)
     p.add_argument('-mp','--mapplot',type=int,help='make map plot?',default=1)
     p.add_argument('-bp','--boxplot',type=int,help='make box plot?',default=1)
+    p.add_argument('-n','--nproc',type=int,help='number of processes used to render the plots',default=1)
+    p.add_argument('--force',type=int,help='rerender figures even if they are newer than their inputs',default=0)
     return p.parse_args()
 
 